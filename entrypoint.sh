@@ -8,10 +8,20 @@ while ! python -c "import psycopg2; psycopg2.connect(host='$POSTGRES_HOST', port
 done
 echo "Database is ready!"
 
+# Auxiliary services (e.g. the ASGI stream server) pass their own command;
+# migrations and collectstatic are left to the web service.
+if [ "$#" -gt 0 ]; then
+    exec "$@"
+fi
+
 # Run migrations
 echo "Running migrations..."
 python manage.py migrate --noinput
 
+# Create upcoming analytics partitions and apply retention
+echo "Maintaining analytics partitions..."
+python manage.py maintain_partitions
+
 # Collect static files (must run at startup so files go into mounted volume)
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
@@ -1,21 +1,44 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
+from unfold.contrib.filters.admin import AutocompleteSelectFilter
+from .changelist import EstimatedCountPaginator, KeysetChangeList, PeriodFilter, TargetAppFilter
+from .exports import export_events
 from .models import MessageImpression, MessageTap
 
+# Admin index with the analytics dashboard (see dashboard.py).
+admin.site.index_template = 'admin/analytics/dashboard.html'
+
+
+class EventExportMixin:
+    actions = ['export_to_csv']
+
+    @admin.action(description="Export selected events to CSV")
+    def export_to_csv(self, request, queryset):
+        return export_events(queryset, f'{self.model._meta.model_name}s.csv')
+
+
+class LargeTableMixin:
+    """Changelist that stays fast on millions of rows; see changelist.py."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    sortable_by = ()
+    list_filter = (('message', AutocompleteSelectFilter), TargetAppFilter, PeriodFilter)
+    list_filter_submit = True
+    list_select_related = ('message',)
+    search_fields = ('=app_id',)
+    search_help_text = "Exact app ID"
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
 
 @admin.register(MessageImpression)
-class MessageImpressionAdmin(ModelAdmin):
+class MessageImpressionAdmin(LargeTableMixin, EventExportMixin, ModelAdmin):
     list_display = ('message', 'app_id', 'timestamp')
-    list_filter = ('app_id', 'timestamp', 'message')
-    search_fields = ('message__title', 'app_id')
-    date_hierarchy = 'timestamp'
     readonly_fields = ('message', 'app_id', 'timestamp')
 
 
 @admin.register(MessageTap)
-class MessageTapAdmin(ModelAdmin):
+class MessageTapAdmin(LargeTableMixin, EventExportMixin, ModelAdmin):
     list_display = ('message', 'app_id', 'timestamp')
-    list_filter = ('app_id', 'timestamp', 'message')
-    search_fields = ('message__title', 'app_id')
-    date_hierarchy = 'timestamp'
     readonly_fields = ('message', 'app_id', 'timestamp')
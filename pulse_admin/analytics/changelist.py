@@ -0,0 +1,166 @@
+"""
+Admin changelists for the raw impression and tap tables, which grow to
+millions of rows.
+
+- EstimatedCountPaginator never runs an exact COUNT(*): the unfiltered
+  total is PostgreSQL's reltuples estimate, and filtered counts stop at
+  COUNT_LIMIT rows.
+- KeysetChangeList pages on (timestamp, id) through the index of the same
+  name instead of OFFSET, so every page costs the same as the first.
+- Filters never scan the table for their choices: messages are picked by
+  autocomplete, apps come from TargetApp, and PeriodFilter bounds the
+  timestamp with a range that combines with the (message, app_id,
+  timestamp) index, replacing date_hierarchy.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+from unfold.contrib.filters.admin import DropdownFilter
+from unfold.views import ChangeList
+
+from messages_app.models import TargetApp
+
+from .partitions import estimated_rows
+
+CURSOR_VAR = 'cursor'
+
+# Filtered changelists count at most this many rows.
+COUNT_LIMIT = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    template_name = 'admin/analytics/keyset_pagination.html'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estimated = False
+        self.capped = False
+
+    @cached_property
+    def count(self):
+        query = self.object_list
+        if connection.vendor == 'postgresql' and not query.query.has_filters():
+            self.estimated = True
+            return estimated_rows(query.model._meta.db_table)
+        count = query.order_by()[:COUNT_LIMIT].count()
+        self.capped = count == COUNT_LIMIT
+        return count
+
+
+def encode_cursor(direction, event):
+    key = [direction, event.timestamp.isoformat(), event.pk]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    direction, timestamp, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if direction not in ('older', 'newer'):
+        raise ValueError(direction)
+    return direction, datetime.fromisoformat(timestamp), int(pk)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Newest events first, paged with ?cursor= from the last (or first) row
+    shown instead of ?p=.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.cursor = decode_cursor(request.GET[CURSOR_VAR])
+        except (KeyError, ValueError, TypeError):
+            self.cursor = None
+        self.older_url = self.newer_url = self.newest_url = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter and search links start again from the newest event.
+        return super().get_query_string(new_params, [*(remove or []), CURSOR_VAR])
+
+    def page(self, direction, timestamp, pk):
+        """Up to list_per_page + 1 events past the cursor, nearest first."""
+        if direction == 'older':
+            queryset = self.queryset.order_by('-timestamp', '-pk')
+            if timestamp is not None:
+                queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk))
+        else:
+            queryset = self.queryset.order_by('timestamp', 'pk').filter(
+                Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, pk__gt=pk)
+            )
+        return list(queryset[:self.list_per_page + 1])
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        direction, timestamp, pk = self.cursor or ('older', None, None)
+        rows = self.page(direction, timestamp, pk)
+        if direction == 'newer' and len(rows) <= self.list_per_page:
+            # Nothing newer than a full page: show the newest page instead.
+            direction, timestamp = 'older', None
+            rows = self.page(direction, None, None)
+
+        more = len(rows) > self.list_per_page
+        rows = rows[:self.list_per_page]
+        if direction == 'newer':
+            rows.reverse()
+        first_page = direction == 'older' and timestamp is None
+        if rows and (more or direction == 'newer'):
+            self.older_url = self.get_query_string({CURSOR_VAR: encode_cursor('older', rows[-1])})
+        if rows and not first_page:
+            self.newer_url = self.get_query_string({CURSOR_VAR: encode_cursor('newer', rows[0])})
+        if not first_page:
+            self.newest_url = self.get_query_string()
+
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = bool(self.older_url or self.newer_url)
+        self.paginator = paginator
+
+
+class TargetAppFilter(DropdownFilter):
+    title = 'app'
+    parameter_name = 'app_id'
+
+    def lookups(self, request, model_admin):
+        return TargetApp.objects.order_by('app_name').values_list('app_id', 'app_name')
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(app_id=self.value())
+        return queryset
+
+
+class PeriodFilter(DropdownFilter):
+    title = 'period'
+    parameter_name = 'period'
+    all_option = ['', 'Any time']
+    periods = {
+        '1h': ('Last hour', timedelta(hours=1)),
+        '24h': ('Last 24 hours', timedelta(days=1)),
+        '7d': ('Last 7 days', timedelta(days=7)),
+        '30d': ('Last 30 days', timedelta(days=30)),
+        '90d': ('Last 90 days', timedelta(days=90)),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, (label, _) in self.periods.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() in self.periods:
+            return queryset.filter(timestamp__gte=timezone.now() - self.periods[self.value()][1])
+        return queryset
@@ -0,0 +1,188 @@
+"""
+Analytics dashboard on the admin index page (Unfold DASHBOARD_CALLBACK).
+
+Everything shown is read from the hourly rollups and the message table
+with a handful of grouped queries, never from the raw event tables, and
+the result is cached for ANALYTICS_DASHBOARD_CACHE_TIMEOUT seconds so
+reloading the dashboard costs one cache read.
+"""
+
+import json
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from messages_app.models import PulseMessage, TargetApp
+
+from .models import MessageStatsHourly
+from .rollups import annotate_totals
+
+DASHBOARD_CACHE_KEY = 'pulse:analytics:dashboard'
+DASHBOARD_DAYS = 30
+# Series drawn per chart, and rows per table.
+TOP_SERIES = 5
+TOP_ROWS = 10
+
+SERIES_COLORS = ['var(--color-primary-600)', '#27ae60', '#3498db', '#e67e22', '#9b59b6', '#95a5a6']
+CHART_OPTIONS = json.dumps({
+    'animation': False,
+    'maintainAspectRatio': False,
+    'plugins': {'legend': {'display': True, 'position': 'bottom'}},
+    'elements': {'point': {'radius': 0}},
+})
+
+
+def ctr(impressions, taps):
+    return round(taps / impressions * 100, 2) if impressions else 0
+
+
+def daily_totals(start, field):
+    """{(day, value of field): [impressions, taps]} from the rollups since start."""
+    rows = MessageStatsHourly.objects.filter(hour__gte=start).annotate(
+        day=TruncDay('hour', tzinfo=dt_timezone.utc)
+    ).values('day', field).annotate(
+        impressions=models.Sum('impressions'),
+        taps=models.Sum('taps'),
+    ).order_by()
+    return {(row['day'], row[field]): [row['impressions'], row['taps']] for row in rows}
+
+
+def sum_by(totals, position):
+    """
+    Collapse {(day, key): [impressions, taps]} to per-day (position 0) or
+    per-key (position 1) totals.
+    """
+    summed = {}
+    for group, (impressions, taps) in totals.items():
+        counters = summed.setdefault(group[position], [0, 0])
+        counters[0] += impressions
+        counters[1] += taps
+    return summed
+
+
+def ranked(totals):
+    """Keys of {key: [impressions, taps]}, most impressions first."""
+    return sorted(totals, key=lambda key: totals[key][0], reverse=True)
+
+
+def line_chart(days, series):
+    """Chart data for the Unfold line component; series is [(label, {day: value})]."""
+    return json.dumps({
+        'labels': [f'{day:%d %b}' for day in days],
+        'datasets': [
+            {
+                'label': label,
+                'data': [values.get(day, 0) for day in days],
+                'borderColor': SERIES_COLORS[index % len(SERIES_COLORS)],
+                'backgroundColor': SERIES_COLORS[index % len(SERIES_COLORS)],
+                'displayYAxis': True,
+            }
+            for index, (label, values) in enumerate(series)
+        ],
+    })
+
+
+def impression_series(totals, keys, names):
+    """Daily impressions of each key in keys, as line_chart() series."""
+    series = {key: {} for key in keys}
+    for (day, key), (impressions, taps) in totals.items():
+        if key in series:
+            series[key][day] = impressions
+    return [(names.get(key, key), series[key]) for key in keys]
+
+
+def campaign_status(now):
+    """Message counts by status badge, in one aggregate query."""
+    started = models.Q(is_active=True, start_date__lte=now)
+    not_ended = models.Q(end_date__isnull=True) | models.Q(end_date__gte=now)
+    return PulseMessage.objects.aggregate(
+        live=models.Count('pk', filter=started & not_ended),
+        scheduled=models.Count('pk', filter=models.Q(is_active=True, start_date__gt=now)),
+        ended=models.Count('pk', filter=started & ~not_ended),
+        drafts=models.Count('pk', filter=models.Q(is_active=False)),
+    )
+
+
+def build_dashboard(now):
+    today = now.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=DASHBOARD_DAYS - 1)
+    days = [start + timedelta(days=offset) for offset in range(DASHBOARD_DAYS)]
+
+    by_app = daily_totals(start, 'app_id')
+    by_message = daily_totals(start, 'message_id')
+    per_day = sum_by(by_app, 0)
+    per_app = sum_by(by_app, 1)
+    per_message = sum_by(by_message, 1)
+
+    top_message_ids = ranked(per_message)[:TOP_ROWS]
+    titles = dict(PulseMessage.objects.filter(pk__in=top_message_ids).values_list('pk', 'title'))
+    app_names = dict(TargetApp.objects.values_list('app_id', 'app_name'))
+
+    live = annotate_totals(
+        PulseMessage.objects.filter(is_active=True, start_date__lte=now).filter(
+            models.Q(end_date__isnull=True) | models.Q(end_date__gte=now)
+        )
+    ).order_by('priority', '-start_date')[:TOP_ROWS]
+
+    return {
+        'days': DASHBOARD_DAYS,
+        'updated_at': now,
+        'status': campaign_status(now),
+        'totals': {
+            'impressions': sum(counters[0] for counters in per_day.values()),
+            'taps': sum(counters[1] for counters in per_day.values()),
+        },
+        'events_chart': line_chart(days, [
+            ('Impressions', {day: counters[0] for day, counters in per_day.items()}),
+            ('Taps', {day: counters[1] for day, counters in per_day.items()}),
+        ]),
+        'ctr_chart': line_chart(days, [
+            ('CTR %', {day: ctr(*counters) for day, counters in per_day.items()}),
+        ]),
+        'apps_chart': line_chart(days, impression_series(by_app, ranked(per_app)[:TOP_SERIES], app_names)),
+        'messages_chart': line_chart(days, impression_series(by_message, top_message_ids[:TOP_SERIES], titles)),
+        'top_messages': {
+            'headers': ['Message', 'Impressions', 'Taps', 'CTR %'],
+            'rows': [
+                [titles.get(message_id, message_id), *per_message[message_id], ctr(*per_message[message_id])]
+                for message_id in top_message_ids
+            ],
+        },
+        'apps': {
+            'headers': ['App', 'Impressions', 'Taps', 'CTR %'],
+            'rows': [
+                [app_names.get(app_id, app_id), *per_app[app_id], ctr(*per_app[app_id])]
+                for app_id in ranked(per_app)
+            ],
+        },
+        'live': {
+            'headers': ['Message', 'Priority', 'Ends', 'Impressions', 'Taps', 'CTR %'],
+            'rows': [
+                [
+                    message.title, message.get_priority_display(),
+                    f'{message.end_date:%Y-%m-%d %H:%M}' if message.end_date else '-',
+                    message.impression_count, message.tap_count,
+                    ctr(message.impression_count, message.tap_count),
+                ]
+                for message in live
+            ],
+        },
+    }
+
+
+def dashboard_data():
+    data = cache.get(DASHBOARD_CACHE_KEY)
+    if data is None:
+        data = build_dashboard(timezone.now())
+        cache.set(DASHBOARD_CACHE_KEY, data, getattr(settings, 'ANALYTICS_DASHBOARD_CACHE_TIMEOUT', 60))
+    return data
+
+
+def dashboard_callback(request, context):
+    context['dashboard'] = dashboard_data()
+    context['dashboard_chart_options'] = CHART_OPTIONS
+    return context
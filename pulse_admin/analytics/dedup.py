@@ -0,0 +1,126 @@
+"""
+Duplicate detection for client event IDs.
+
+Clients may send an event_id (UUID) with each impression or tap and retry
+freely: an ID recorded within the last ANALYTICS_DEDUP_WINDOW seconds is
+dropped instead of counted twice. Checks run cheapest first:
+
+1. DedupWindow, a per-process set of recently recorded IDs split into time
+   buckets that expire whole, so its memory is bounded by the window.
+2. One indexed query per model for IDs not seen locally (retries that
+   land on another worker).
+3. The unique event_id index of each partition, for concurrent retries
+   that race past both checks; write_events() drops them on IntegrityError.
+
+Uniqueness is enforced per monthly partition rather than over all history,
+so there is no ever-growing global index for every insert to contend on.
+"""
+
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+
+BUCKETS = 6
+
+
+def dedup_window():
+    return getattr(settings, 'ANALYTICS_DEDUP_WINDOW', 86400)
+
+
+class DedupWindow:
+    """Thread-safe set of event IDs recorded in the last dedup_window() seconds."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def _current_bucket(self):
+        # IDs are kept for between (BUCKETS - 1) and BUCKETS bucket widths.
+        width = max(dedup_window() / BUCKETS, 1)
+        current = int(time.monotonic() // width)
+        for key in [key for key in self.buckets if key <= current - BUCKETS]:
+            del self.buckets[key]
+        return current
+
+    def seen(self, event_ids):
+        """Return the subset of event_ids recorded within the window."""
+        with self.lock:
+            self._current_bucket()
+            return {
+                event_id for event_id in event_ids
+                if any(event_id in bucket for bucket in self.buckets.values())
+            }
+
+    def add(self, event_ids):
+        with self.lock:
+            self.buckets.setdefault(self._current_bucket(), set()).update(event_ids)
+
+
+_window = DedupWindow()
+
+
+def recorded_event_ids(instances, window=None):
+    """
+    Event IDs of instances that are already in the database, looking back
+    window seconds from the oldest instance (or over all history).
+    """
+    by_model = {}
+    for instance in instances:
+        if instance.event_id is not None:
+            by_model.setdefault(type(instance), []).append(instance)
+
+    recorded = set()
+    for model, group in by_model.items():
+        queryset = model.objects.filter(event_id__in=[instance.event_id for instance in group])
+        if window is not None:
+            since = min(instance.timestamp for instance in group) - timedelta(seconds=window)
+            queryset = queryset.filter(timestamp__gte=since)
+        recorded.update(queryset.values_list('event_id', flat=True))
+    return recorded
+
+
+def find_duplicates(instances):
+    """
+    Return the positions in instances of events whose event_id was already
+    recorded within the dedup window or repeats an earlier one in the list.
+    """
+    duplicates = set()
+    candidates = {}
+    for index, instance in enumerate(instances):
+        if instance.event_id is None:
+            continue
+        if instance.event_id in candidates:
+            duplicates.add(index)
+        else:
+            candidates[instance.event_id] = index
+
+    if candidates:
+        seen = _window.seen(candidates)
+        unseen = [instances[index] for event_id, index in candidates.items() if event_id not in seen]
+        # Spooled requests stay off the database; the replayer checks instead.
+        if unseen and getattr(settings, 'ANALYTICS_INGEST_MODE', 'direct') != 'spool':
+            seen |= recorded_event_ids(unseen, dedup_window())
+        duplicates.update(candidates[event_id] for event_id in seen)
+    return duplicates
+
+
+def drop_duplicates(instances):
+    """instances without those whose event_id is already stored or repeated."""
+    recorded = recorded_event_ids(instances)
+    unique = []
+    for instance in instances:
+        if instance.event_id is not None:
+            if instance.event_id in recorded:
+                continue
+            recorded.add(instance.event_id)
+        unique.append(instance)
+    return unique
+
+
+def remember(instances):
+    """Add the event IDs of recorded instances to this process's window."""
+    event_ids = [instance.event_id for instance in instances if instance.event_id is not None]
+    if event_ids:
+        _window.add(event_ids)
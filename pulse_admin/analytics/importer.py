@@ -0,0 +1,209 @@
+"""
+Bulk import of historic impressions and taps (manage.py import_events).
+
+Input is CSV with a header row or NDJSON, optionally gzipped, one event
+per row with the fields type, message_id, app_id, timestamp and an
+optional event_id. Timestamps are ISO 8601 (UTC when no offset is given)
+or Unix epoch seconds, milliseconds or microseconds.
+
+Rows are read and validated one at a time and written in fixed-size
+batches, so memory stays constant however large the input is. On
+PostgreSQL each batch is streamed with COPY into a temporary staging
+table and moved into the partitioned tables with one INSERT ... SELECT
+per model, after creating the monthly partitions the batch needs.
+ON CONFLICT DO NOTHING skips event IDs that are already stored, so an
+interrupted import that has event IDs can simply be run again. Other
+backends fall back to bulk_create.
+
+Imported rows are not folded into the hourly rollups; rebuild them for
+the imported range afterwards (import_events --update-rollups).
+"""
+
+import csv
+import gzip
+import io
+import json
+import sys
+import uuid
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .models import EVENT_MODELS
+from .partitions import create_partitions, month_start
+
+STAGING_TABLE = 'analytics_import_staging'
+
+
+class InvalidEvent(ValueError):
+    def __init__(self, reason, value):
+        super().__init__(f'{reason} {value!r}')
+        self.reason = reason
+
+
+def open_input(path):
+    """Open path ('-' for stdin) as text, decompressing .gz files."""
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_rows(stream, input_format):
+    """Yield each CSV or NDJSON record, or an InvalidEvent for bad JSON."""
+    if input_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield InvalidEvent('invalid JSON on line', number)
+
+
+def parse_timestamp(value):
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.replace('.', '', 1).isdigit()):
+        seconds = float(value)
+        # Firebase exports use microseconds; accept ms and s as well.
+        if seconds > 1e14:
+            seconds /= 1e6
+        elif seconds > 1e11:
+            seconds /= 1e3
+        return datetime.fromtimestamp(seconds, dt_timezone.utc)
+    timestamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=dt_timezone.utc)
+    return timestamp
+
+
+def parse_event(row, default_type, message_ids):
+    """Return (model, message_id, app_id, timestamp, event_id) for a row."""
+    if isinstance(row, InvalidEvent):
+        raise row
+    if not isinstance(row, dict):
+        raise InvalidEvent('not an object', row)
+    event_type = row.get('type') or default_type
+    if event_type not in EVENT_MODELS:
+        raise InvalidEvent('unknown type', event_type)
+    try:
+        message_id = int(row.get('message_id'))
+    except (TypeError, ValueError):
+        raise InvalidEvent('invalid message_id', row.get('message_id'))
+    if message_id not in message_ids:
+        raise InvalidEvent('unknown message_id', message_id)
+    app_id = str(row.get('app_id') or '')
+    if not app_id or len(app_id) > 50:
+        raise InvalidEvent('invalid app_id', app_id)
+    try:
+        timestamp = parse_timestamp(row.get('timestamp'))
+    except (TypeError, ValueError, OverflowError):
+        raise InvalidEvent('invalid timestamp', row.get('timestamp'))
+    event_id = row.get('event_id') or None
+    if event_id is not None:
+        try:
+            event_id = uuid.UUID(str(event_id))
+        except ValueError:
+            raise InvalidEvent('invalid event_id', event_id)
+    return EVENT_MODELS[event_type], message_id, app_id, timestamp, event_id
+
+
+class EventImporter:
+    """Validates events and writes them in batches; see the module docstring."""
+
+    def __init__(self, message_ids, default_type=None, batch_size=10000, progress=None):
+        self.message_ids = message_ids
+        self.default_type = default_type
+        self.batch_size = batch_size
+        self.progress = progress
+        self.batch = []
+        self.imported = 0
+        self.duplicates = 0
+        self.skipped = Counter()
+        self.first_errors = []
+        self.oldest = None
+        self.newest = None
+        self.months = set()
+
+    def run(self, rows):
+        for row in rows:
+            try:
+                self.batch.append(parse_event(row, self.default_type, self.message_ids))
+            except InvalidEvent as exc:
+                self.skipped[exc.reason] += 1
+                if len(self.first_errors) < 10:
+                    self.first_errors.append(str(exc))
+                continue
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+        self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        timestamps = [event[3] for event in self.batch]
+        oldest, newest = min(timestamps), max(timestamps)
+        self.oldest = oldest if self.oldest is None else min(self.oldest, oldest)
+        self.newest = newest if self.newest is None else max(self.newest, newest)
+
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Historic months would otherwise pile up in the DEFAULT partition.
+                months = {month_start(timestamp) for timestamp in timestamps} - self.months
+                create_partitions(months)
+                self.months |= months
+                inserted = self.copy_batch()
+            else:
+                inserted = self.create_batch()
+        self.duplicates += len(self.batch) - inserted
+        self.imported += inserted
+        self.batch = []
+        if self.progress:
+            self.progress(self)
+
+    def copy_batch(self):
+        quote = connection.ops.quote_name
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for model, message_id, app_id, timestamp, event_id in self.batch:
+            writer.writerow([
+                model._meta.db_table, message_id, app_id, timestamp.isoformat(),
+                event_id if event_id is not None else '',
+            ])
+        buffer.seek(0)
+
+        columns = ', '.join(quote(column) for column in ('message_id', 'app_id', 'timestamp', 'event_id'))
+        inserted = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} "
+                f"(target text, message_id bigint, app_id varchar(50), {quote('timestamp')} timestamptz, event_id uuid) "
+                "ON COMMIT DELETE ROWS"
+            )
+            cursor.copy_expert(f"COPY {STAGING_TABLE} (target, {columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            for model in EVENT_MODELS.values():
+                table = model._meta.db_table
+                cursor.execute(
+                    f"INSERT INTO {quote(table)} ({columns}) "
+                    f"SELECT {columns} FROM {STAGING_TABLE} WHERE target = %s "
+                    "ON CONFLICT DO NOTHING",
+                    [table]
+                )
+                inserted += cursor.rowcount
+        return inserted
+
+    def create_batch(self):
+        # Skipped duplicates are not reported here, so all rows count.
+        for model in EVENT_MODELS.values():
+            model.objects.bulk_create(
+                [
+                    model(message_id=message_id, app_id=app_id, timestamp=timestamp, event_id=event_id)
+                    for event_model, message_id, app_id, timestamp, event_id in self.batch
+                    if event_model is model
+                ],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+        return len(self.batch)
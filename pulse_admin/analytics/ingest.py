@@ -0,0 +1,192 @@
+"""
+Ingestion of impression and tap events.
+
+ANALYTICS_INGEST_MODE selects how events reach the database:
+
+- 'direct': one INSERT per event, acknowledged after commit (default).
+- 'buffer': events are appended to an in-process buffer and acknowledged
+  at once; a background thread writes them with bulk_create. Events still
+  buffered when a worker is killed are lost.
+- 'flush': buffered as above, but the request waits until the bulk insert
+  containing its event has committed. Each request wakes the flusher at
+  once; requests arriving while it is writing share the next insert, so
+  this pays off with threaded workers (gunicorn --threads).
+- 'spool': events are appended to a local spool file and acknowledged at
+  once; manage.py replay_spool writes them to the database (see spool.py).
+  Requests never touch the database, so they keep answering while it is
+  slow or restarting.
+
+The buffer is flushed when it holds ANALYTICS_BUFFER_SIZE events, after
+ANALYTICS_BUFFER_INTERVAL seconds, and at interpreter exit.
+
+Callers drop retried events first with dedup.find_duplicates(); recorded
+event IDs are remembered for the dedup window.
+"""
+
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+from .dedup import drop_duplicates, remember
+from .rollups import fold_events
+from .spool import spool_events
+
+logger = logging.getLogger(__name__)
+
+
+class PendingFlush:
+    """Completion handle for the flush that writes a batch of events."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+
+    def resolve(self, ok):
+        self.ok = ok
+        self.done.set()
+
+    def wait(self, timeout=None):
+        """Wait for the flush; True once the events are committed."""
+        return self.done.wait(timeout) and self.ok
+
+
+class EventBuffer:
+    """Thread-safe buffer of model instances, bulk-inserted in the background."""
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.events = []
+        self.pending = PendingFlush()
+        self.flush_requested = False
+        self.thread = None
+        self.pid = None
+
+    def add(self, instances, wait=False):
+        """
+        Queue unsaved event instances; returns the PendingFlush for them.
+        Pass wait=True if the caller will wait on it, so the flusher runs
+        now instead of after ANALYTICS_BUFFER_INTERVAL.
+        """
+        with self.lock:
+            self._ensure_thread()
+            self.events.extend(instances)
+            pending = self.pending
+            if wait or len(self.events) >= getattr(settings, 'ANALYTICS_BUFFER_SIZE', 500):
+                self.flush_requested = True
+                self.lock.notify()
+            return pending
+
+    def _ensure_thread(self):
+        # Started lazily so each forked worker gets its own flusher.
+        if self.pid != os.getpid() or not (self.thread and self.thread.is_alive()):
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='analytics-flusher', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.lock:
+                # A request made while the last flush was running (or before
+                # this thread started) would otherwise wait a full interval.
+                if not self.flush_requested:
+                    self.lock.wait(getattr(settings, 'ANALYTICS_BUFFER_INTERVAL', 1.0))
+                self.flush_requested = False
+            self.flush()
+
+    def take(self):
+        """Detach the buffered events and their PendingFlush."""
+        with self.lock:
+            events, self.events = self.events, []
+            pending, self.pending = self.pending, PendingFlush()
+        return events, pending
+
+    def flush(self):
+        events, pending = self.take()
+        if not events:
+            pending.resolve(True)
+            return 0
+        try:
+            write_events(events)
+        except Exception:
+            logger.exception("Failed to write %d buffered analytics events", len(events))
+            pending.resolve(False)
+            return 0
+        finally:
+            if threading.current_thread() is self.thread:
+                connection.close()
+        pending.resolve(True)
+        return len(events)
+
+
+def write_events(events):
+    """
+    bulk_create a mixed list of unsaved impressions and taps, one INSERT
+    per model, and fold them into the hourly rollups in the same
+    transaction. Events whose message was deleted meanwhile, or whose
+    event_id a concurrent retry stored first, are dropped.
+    """
+    try:
+        _write_events(events)
+    except IntegrityError:
+        from messages_app.models import PulseMessage
+
+        existing = set(PulseMessage.objects.filter(
+            id__in={event.message_id for event in events}
+        ).values_list('id', flat=True))
+        events = drop_duplicates([event for event in events if event.message_id in existing])
+        for event in events:
+            event.pk = None
+        _write_events(events)
+
+
+def _write_events(events):
+    by_model = {}
+    for event in events:
+        by_model.setdefault(type(event), []).append(event)
+
+    with transaction.atomic():
+        for model, instances in by_model.items():
+            model.objects.bulk_create(instances)
+        fold_events(events)
+
+
+_buffer = EventBuffer()
+atexit.register(_buffer.flush)
+
+
+def record_events(instances):
+    """
+    Record unsaved impressions and taps according to ANALYTICS_INGEST_MODE.
+    Returns False if they could not be committed in 'flush' mode or
+    spooled in 'spool' mode.
+    """
+    mode = getattr(settings, 'ANALYTICS_INGEST_MODE', 'direct')
+    if mode == 'spool':
+        try:
+            spool_events(instances)
+        except OSError:
+            logger.exception("Failed to spool %d analytics events", len(instances))
+            return False
+        remember(instances)
+        return True
+
+    if mode == 'direct':
+        write_events(instances)
+        remember(instances)
+        return True
+
+    pending = _buffer.add(instances, wait=mode == 'flush')
+    if mode == 'flush':
+        if not pending.wait(getattr(settings, 'ANALYTICS_FLUSH_TIMEOUT', 10)):
+            return False
+    remember(instances)
+    return True
+
+
+def flush_events():
+    """Write everything buffered in this process now."""
+    return _buffer.flush()
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from analytics.importer import EventImporter, open_input, read_rows
+from analytics.models import EVENT_MODELS
+from analytics.rollups import rebuild_rollups
+from messages_app.models import PulseMessage
+
+
+class Command(BaseCommand):
+    help = 'Bulk import impressions and taps from CSV or NDJSON (COPY on PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or NDJSON file, optionally .gz; '-' reads stdin")
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'ndjson'],
+            help='Input format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--type',
+            choices=sorted(EVENT_MODELS),
+            help='Event type for rows without a type field',
+        )
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per COPY batch')
+        parser.add_argument(
+            '--update-rollups',
+            action='store_true',
+            help='Rebuild the hourly rollups for the imported time range afterwards',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format']
+        if input_format is None:
+            name = path.removesuffix('.gz')
+            if name.endswith('.csv'):
+                input_format = 'csv'
+            elif name.endswith(('.ndjson', '.jsonl', '.json')):
+                input_format = 'ndjson'
+            else:
+                raise CommandError('Cannot tell the input format; pass --format.')
+
+        importer = EventImporter(
+            message_ids=set(PulseMessage.objects.values_list('id', flat=True)),
+            default_type=options['type'],
+            batch_size=options['batch_size'],
+            progress=self.report_progress,
+        )
+        try:
+            with open_input(path) as stream:
+                importer.run(read_rows(stream, input_format))
+        except OSError as exc:
+            raise CommandError(f'Cannot read {path}: {exc}')
+
+        for error in importer.first_errors:
+            self.stderr.write(f'Skipped: {error}')
+        skipped = ', '.join(f'{count} {reason}' for reason, count in importer.skipped.most_common())
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.imported} event(s), {importer.duplicates} duplicate(s) ignored'
+            + (f'; skipped {skipped}.' if skipped else '.')
+        ))
+
+        if importer.imported and options['update_rollups']:
+            rows = rebuild_rollups(importer.oldest, importer.newest + timedelta(hours=1))
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} hourly rollup row(s).'))
+        elif importer.imported:
+            self.stdout.write('Hourly rollups were not updated; run rebuild_rollups for the imported range.')
+
+    def report_progress(self, importer):
+        skipped = sum(importer.skipped.values())
+        self.stdout.write(f'{importer.imported} imported, {skipped} skipped...')
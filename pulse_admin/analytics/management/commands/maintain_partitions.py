@@ -0,0 +1,80 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+from analytics.models import MessageImpression, MessageTap
+from analytics.partitions import add_months, drop_partitions, ensure_partitions, month_start, supports_partitions
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly analytics partitions and drop expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=getattr(settings, 'ANALYTICS_PARTITION_MONTHS_AHEAD', 3),
+            help='Months after the current one to create partitions for',
+        )
+        parser.add_argument(
+            '--retain-months',
+            type=int,
+            default=getattr(settings, 'ANALYTICS_RETENTION_MONTHS', 0),
+            help='Full months of raw events to keep before the current one (0 keeps everything)',
+        )
+        parser.add_argument(
+            '--detach',
+            action='store_true',
+            help='Detach expired partitions and keep them as plain tables instead of dropping them',
+        )
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running and maintain partitions every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=3600,
+            help='Seconds between runs with --watch',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                self.maintain(options)
+            except DatabaseError:
+                if not options['watch']:
+                    raise
+                # Database down or restarting: try again next interval.
+                logger.exception("Partition maintenance failed; retrying in %s seconds", options['interval'])
+                close_old_connections()
+            if not options['watch']:
+                return
+            time.sleep(options['interval'])
+
+    def maintain(self, options):
+        now = timezone.now()
+        for name in ensure_partitions(now, options['months_ahead']):
+            self.stdout.write(f'Created partition {name}')
+
+        if options['retain_months'] <= 0:
+            return
+        cutoff = add_months(month_start(now), -options['retain_months'])
+
+        if not supports_partitions():
+            # No partitions to drop on this backend; delete row by row.
+            for model in (MessageImpression, MessageTap):
+                deleted, _ = model.objects.filter(timestamp__lt=cutoff).delete()
+                self.stdout.write(f'Deleted {deleted} {model._meta.verbose_name_plural.lower()} before {cutoff:%Y-%m}')
+            return
+
+        action = 'Detached' if options['detach'] else 'Dropped'
+        for name in drop_partitions(cutoff, detach=options['detach']):
+            self.stdout.write(f'{action} partition {name}')
+        self.stdout.write(self.style.SUCCESS(f'Raw events before {cutoff:%Y-%m} removed; hourly rollups are kept.'))
@@ -0,0 +1,25 @@
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from analytics.rollups import rebuild_rollups
+
+
+def parse_date(value):
+    try:
+        return datetime.combine(datetime.strptime(value, '%Y-%m-%d').date(), time.min, dt_timezone.utc)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly impression/tap rollups from the raw analytics tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD, UTC; default: oldest raw event)')
+        parser.add_argument('--end', help='Day to stop before (YYYY-MM-DD, UTC)')
+
+    def handle(self, *args, **options):
+        start = parse_date(options['start']) if options['start'] else None
+        end = parse_date(options['end']) if options['end'] else None
+        rows = rebuild_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} hourly rollup row(s).'))
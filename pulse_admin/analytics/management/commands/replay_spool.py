@@ -0,0 +1,51 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from analytics.spool import SpoolReplayer
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Write spooled analytics events ('spool' ingest mode) to the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running and replay new events as they are spooled',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds between replays with --watch',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Events per bulk insert',
+        )
+
+    def handle(self, *args, **options):
+        replayer = SpoolReplayer(batch_size=options['batch_size'])
+        replayer.lock()
+
+        while True:
+            try:
+                written = replayer.replay()
+            except DatabaseError:
+                if not options['watch']:
+                    raise
+                # Database down or restarting: keep the spool and retry.
+                logger.exception("Spool replay failed; retrying in %s seconds", options['interval'])
+                close_old_connections()
+                written = 0
+            if written or not options['watch']:
+                self.stdout.write(self.style.SUCCESS(f'Replayed {written} spooled event(s).'))
+            if not options['watch']:
+                return
+            time.sleep(options['interval'])
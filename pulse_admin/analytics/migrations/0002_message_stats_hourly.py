@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:40
+
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import TruncHour
+
+
+def backfill_rollups(apps, schema_editor):
+    # Counts are read from the rollups from now on; fold in existing events.
+    MessageStatsHourly = apps.get_model('analytics', 'MessageStatsHourly')
+    counts = {}
+    for model_name, field in (('MessageImpression', 'impressions'), ('MessageTap', 'taps')):
+        rows = apps.get_model('analytics', model_name).objects.annotate(
+            hour=TruncHour('timestamp', tzinfo=dt_timezone.utc)
+        ).values('message_id', 'app_id', 'hour').annotate(
+            count=models.Count('id')
+        ).order_by()
+        for row in rows.iterator():
+            key = (row['message_id'], row['app_id'], row['hour'])
+            counts.setdefault(key, {})[field] = row['count']
+    MessageStatsHourly.objects.bulk_create(
+        [
+            MessageStatsHourly(message_id=message_id, app_id=app_id, hour=hour, **counters)
+            for (message_id, app_id, hour), counters in counts.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('messages_app', '0004_add_button_text_color'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageStatsHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('app_id', models.CharField(max_length=50)),
+                ('hour', models.DateTimeField(help_text='Start of the hour (UTC)')),
+                ('impressions', models.PositiveBigIntegerField(default=0)),
+                ('taps', models.PositiveBigIntegerField(default=0)),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='messages_app.pulsemessage')),
+            ],
+            options={
+                'verbose_name': 'Hourly Message Stats',
+                'verbose_name_plural': 'Hourly Message Stats',
+                'ordering': ['-hour'],
+                'indexes': [models.Index(fields=['hour'], name='analytics_m_hour_b98389_idx')],
+                'constraints': [models.UniqueConstraint(fields=('message', 'app_id', 'hour'), name='unique_message_app_hour')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+
+def partition_event_tables(apps, schema_editor):
+    # Partitioning is PostgreSQL-only; other backends keep plain tables.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from analytics.partitions import PARTITIONED_TABLES, partition_table
+
+    months_ahead = getattr(settings, 'ANALYTICS_PARTITION_MONTHS_AHEAD', 3)
+    for table in PARTITIONED_TABLES:
+        partition_table(table, timezone.now(), months_ahead)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0002_message_stats_hourly"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_event_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:45
+
+from django.db import migrations, models
+
+
+def create_dedup_indexes(apps, schema_editor):
+    # Unique per partition on PostgreSQL, so it is created outside the model
+    # state (see analytics/partitions.py). Dropped along with the column.
+    from analytics.partitions import PARTITIONED_TABLES, create_dedup_indexes
+
+    for table in PARTITIONED_TABLES:
+        create_dedup_indexes(table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_partition_events_by_month'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messageimpression',
+            name='event_id',
+            field=models.UUIDField(blank=True, help_text='Client-generated ID used to drop retried duplicates', null=True),
+        ),
+        migrations.AddField(
+            model_name='messagetap',
+            name='event_id',
+            field=models.UUIDField(blank=True, help_text='Client-generated ID used to drop retried duplicates', null=True),
+        ),
+        migrations.RunPython(create_dedup_indexes, migrations.RunPython.noop),
+    ]
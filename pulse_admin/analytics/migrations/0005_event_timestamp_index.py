@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_event_id'),
+        ('messages_app', '0004_add_button_text_color'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messageimpression',
+            index=models.Index(fields=['timestamp', 'id'], name='analytics_m_timesta_f208d2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='messagetap',
+            index=models.Index(fields=['timestamp', 'id'], name='analytics_m_timesta_739f20_idx'),
+        ),
+    ]
@@ -11,6 +11,10 @@ class MessageImpression(models.Model):
     )
     app_id = models.CharField(max_length=50)
     timestamp = models.DateTimeField(default=timezone.now)
+    event_id = models.UUIDField(
+        null=True, blank=True,
+        help_text="Client-generated ID used to drop retried duplicates"
+    )
 
     class Meta:
         ordering = ['-timestamp']
@@ -18,6 +22,8 @@ class MessageImpression(models.Model):
         verbose_name_plural = 'Message Impressions'
         indexes = [
             models.Index(fields=['message', 'app_id', 'timestamp']),
+            # Keyset pagination in the admin (see changelist.py).
+            models.Index(fields=['timestamp', 'id']),
         ]
 
     def __str__(self):
@@ -33,6 +39,10 @@ class MessageTap(models.Model):
     )
     app_id = models.CharField(max_length=50)
     timestamp = models.DateTimeField(default=timezone.now)
+    event_id = models.UUIDField(
+        null=True, blank=True,
+        help_text="Client-generated ID used to drop retried duplicates"
+    )
 
     class Meta:
         ordering = ['-timestamp']
@@ -40,7 +50,49 @@ class MessageTap(models.Model):
         verbose_name_plural = 'Message Taps'
         indexes = [
             models.Index(fields=['message', 'app_id', 'timestamp']),
+            # Keyset pagination in the admin (see changelist.py).
+            models.Index(fields=['timestamp', 'id']),
         ]
 
     def __str__(self):
         return f"Tap: {self.message.title} ({self.app_id})"
+
+
+class MessageStatsHourly(models.Model):
+    """
+    Impression and tap counts per message, app and hour.
+    Kept up to date on ingest (see rollups.py); rebuild with rebuild_rollups.
+    """
+    message = models.ForeignKey(
+        'messages_app.PulseMessage',
+        on_delete=models.CASCADE,
+        related_name='hourly_stats'
+    )
+    app_id = models.CharField(max_length=50)
+    hour = models.DateTimeField(help_text="Start of the hour (UTC)")
+    impressions = models.PositiveBigIntegerField(default=0)
+    taps = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-hour']
+        verbose_name = 'Hourly Message Stats'
+        verbose_name_plural = 'Hourly Message Stats'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['message', 'app_id', 'hour'],
+                name='unique_message_app_hour',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+
+    def __str__(self):
+        return f"{self.message.title} ({self.app_id}) {self.hour:%Y-%m-%d %H:00}"
+
+
+# Event type names used by the API and the spool.
+EVENT_MODELS = {
+    'impression': MessageImpression,
+    'tap': MessageTap,
+}
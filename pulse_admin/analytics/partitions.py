@@ -0,0 +1,264 @@
+"""
+Monthly range partitions for the raw analytics tables (PostgreSQL only).
+
+Migration 0003 turns analytics_messageimpression and analytics_messagetap
+into tables partitioned by month on timestamp. Each has a DEFAULT
+partition that catches rows outside the created months; ensure_partitions()
+moves them into their month when it is created. The primary key of a
+partitioned table has to include the partition column, so it is
+(id, timestamp); Django still addresses rows by id, which stays unique.
+
+Inserts, index maintenance and vacuum only ever touch the current month,
+time-bounded queries are pruned to the months they cover, and retention
+drops (or detaches) whole months with drop_partitions() instead of
+running DELETE. Run the maintain_partitions command to do both.
+
+Client event IDs are unique per partition rather than across all history
+(see dedup.py): every partition gets its own unique index on event_id,
+which PostgreSQL does not allow on the partitioned parent.
+"""
+
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+PARTITIONED_TABLES = ('analytics_messageimpression', 'analytics_messagetap')
+PARTITION_COLUMN = 'timestamp'
+DEDUP_COLUMN = 'event_id'
+MONTHLY_SUFFIX = re.compile(r'_p(\d{4})(\d{2})$')
+
+
+def supports_partitions():
+    return connection.vendor == 'postgresql'
+
+
+def month_start(value):
+    """First instant of the UTC month containing value."""
+    return value.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def default_partition_name(table):
+    return f'{table}_default'
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+    return cursor.fetchone() is not None
+
+
+def partitions_of(cursor, table):
+    """Names of every partition of table, including the DEFAULT one."""
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(%s)",
+        [table]
+    )
+    return [name for (name,) in cursor.fetchall()]
+
+
+def estimated_rows(table):
+    """
+    Row count of table (summed over its partitions) from the planner's
+    statistics, without scanning it. Tables never analyzed count as empty.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0)::bigint FROM pg_class "
+            "WHERE oid = to_regclass(%s) "
+            "OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))",
+            [table, table]
+        )
+        return cursor.fetchone()[0]
+
+
+def monthly_partitions(cursor, table):
+    """Return {month: partition name} for the monthly partitions of table."""
+    partitions = {}
+    for name in partitions_of(cursor, table):
+        match = MONTHLY_SUFFIX.search(name)
+        if match and name == f'{table}{match.group(0)}':
+            month = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+            partitions[month] = name
+    return partitions
+
+
+def create_dedup_index(cursor, relation):
+    """Unique index on the event IDs of one partition (or plain table)."""
+    quote = connection.ops.quote_name
+    cursor.execute(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS {quote(f'{relation}_{DEDUP_COLUMN}_uniq')} "
+        f"ON {quote(relation)} ({quote(DEDUP_COLUMN)}) WHERE {quote(DEDUP_COLUMN)} IS NOT NULL"
+    )
+
+
+def create_dedup_indexes(table):
+    """Add the event ID index to table, or to each of its partitions."""
+    with connection.cursor() as cursor:
+        if supports_partitions() and is_partitioned(cursor, table):
+            for relation in partitions_of(cursor, table):
+                create_dedup_index(cursor, relation)
+        else:
+            create_dedup_index(cursor, table)
+
+
+def has_column(cursor, table, column):
+    return any(
+        info.name == column
+        for info in connection.introspection.get_table_description(cursor, table)
+    )
+
+
+def create_partition(cursor, table, month):
+    """
+    Create the partition of table for month. Rows for that month already
+    in the DEFAULT partition are moved into it first, since PostgreSQL
+    refuses to add a partition that would overlap them.
+    """
+    quote = connection.ops.quote_name
+    name = partition_name(table, month)
+    default = default_partition_name(table)
+    bounds = [month.isoformat(), add_months(month, 1).isoformat()]
+    column = quote(PARTITION_COLUMN)
+
+    cursor.execute(
+        f"SELECT 1 FROM {quote(default)} WHERE {column} >= %s AND {column} < %s LIMIT 1",
+        bounds
+    )
+    if cursor.fetchone() is None:
+        cursor.execute(
+            f"CREATE TABLE {quote(name)} PARTITION OF {quote(table)} FOR VALUES FROM (%s) TO (%s)",
+            bounds
+        )
+    else:
+        cursor.execute(f"CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {quote(default)} WHERE {column} >= %s AND {column} < %s RETURNING *) "
+            f"INSERT INTO {quote(name)} SELECT * FROM moved",
+            bounds
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)",
+            bounds
+        )
+
+    # Partition-local, so it is not inherited from the parent.
+    if has_column(cursor, table, DEDUP_COLUMN):
+        create_dedup_index(cursor, name)
+
+
+def create_partitions(months):
+    """Create any missing partitions for the given month starts. Returns the names created."""
+    if not supports_partitions():
+        return []
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            existing = monthly_partitions(cursor, table)
+            for month in sorted(set(months) - set(existing)):
+                create_partition(cursor, table, month)
+                created.append(partition_name(table, month))
+    return created
+
+
+def ensure_partitions(now, months_ahead):
+    """
+    Create any missing monthly partitions from now's month through
+    months_ahead months later. Returns the names created.
+    """
+    first = month_start(now)
+    return create_partitions(add_months(first, offset) for offset in range(months_ahead + 1))
+
+
+def drop_partitions(before, detach=False):
+    """
+    Remove the monthly partitions that end on or before the start of
+    before's month, and delete older stray rows from the DEFAULT
+    partitions. With detach, partitions are detached and left as plain
+    tables (for archiving) instead of dropped. Returns the names removed.
+    """
+    if not supports_partitions():
+        return []
+    quote = connection.ops.quote_name
+    cutoff = month_start(before)
+    removed = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            for month, name in sorted(monthly_partitions(cursor, table).items()):
+                if add_months(month, 1) > cutoff:
+                    continue
+                if detach:
+                    cursor.execute(f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}")
+                else:
+                    cursor.execute(f"DROP TABLE {quote(name)}")
+                removed.append(name)
+            cursor.execute(
+                f"DELETE FROM {quote(default_partition_name(table))} WHERE {quote(PARTITION_COLUMN)} < %s",
+                [cutoff.isoformat()]
+            )
+    return removed
+
+
+def partition_table(table, now, months_ahead):
+    """
+    Convert a plain table into one partitioned by month, keeping its
+    rows, columns, indexes and foreign keys. Used by migration 0003.
+    """
+    quote = connection.ops.quote_name
+    old = f'{table}_unpartitioned'
+    column = quote(PARTITION_COLUMN)
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor, table):
+            return
+
+        cursor.execute(
+            "SELECT pg_get_indexdef(indexrelid) FROM pg_index "
+            "WHERE indrelid = to_regclass(%s) AND NOT indisprimary",
+            [table]
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [table]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT MIN({column}) FROM {quote(table)}")
+        (oldest,) = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old)}")
+        cursor.execute(
+            f"CREATE TABLE {quote(table)} "
+            f"(LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING IDENTITY, PRIMARY KEY (id, {column})) "
+            f"PARTITION BY RANGE ({column})"
+        )
+        cursor.execute(f"CREATE TABLE {quote(default_partition_name(table))} PARTITION OF {quote(table)} DEFAULT")
+
+        month = month_start(oldest or now)
+        last = add_months(month_start(now), months_ahead)
+        while month <= last:
+            create_partition(cursor, table, month)
+            month = add_months(month, 1)
+
+        cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(old)}")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) "
+            f"FROM {quote(table)}",
+            [table]
+        )
+        # Dropping the old table frees its index and constraint names.
+        cursor.execute(f"DROP TABLE {quote(old)}")
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}")
@@ -0,0 +1,203 @@
+"""
+Hourly rollups of impressions and taps (MessageStatsHourly).
+
+Every batch written by ingest.write_events() is folded into the rollups in
+the same transaction with an INSERT ... ON CONFLICT DO UPDATE that adds to
+the existing counters (PostgreSQL and SQLite 3.24+). Admin and reporting
+counts read the rollups instead of counting raw rows; rebuild_rollups()
+reconciles them from the raw tables.
+"""
+
+from collections import Counter
+from datetime import timezone as dt_timezone
+
+from django.db import connection, models, transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncDay, TruncHour, TruncWeek
+
+from .models import MessageImpression, MessageStatsHourly, MessageTap
+
+# Rows per upsert statement, well under SQLite's bound-parameter limit.
+FOLD_BATCH_SIZE = 500
+
+# Time series bucket sizes (see time_series()).
+BUCKET_FUNCTIONS = {
+    'hour': TruncHour,
+    'day': TruncDay,
+    'week': TruncWeek,
+}
+
+# Counter column per raw event model.
+COUNTER_FIELDS = {
+    MessageImpression: 'impressions',
+    MessageTap: 'taps',
+}
+
+
+def hour_bucket(timestamp):
+    """Start of the UTC hour containing timestamp."""
+    return timestamp.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def fold_counts(counts):
+    """
+    Add counts to the rollups. counts maps (message_id, app_id, hour) to
+    {'impressions': n, 'taps': n}.
+    """
+    if not counts:
+        return
+    table = MessageStatsHourly._meta.db_table
+    quote = connection.ops.quote_name
+    # Sorted so concurrent writers lock rows in the same order.
+    rows = sorted(counts.items())
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), FOLD_BATCH_SIZE):
+            batch = rows[offset:offset + FOLD_BATCH_SIZE]
+            params = []
+            for (message_id, app_id, hour), counters in batch:
+                params.extend([
+                    message_id, app_id, connection.ops.adapt_datetimefield_value(hour),
+                    counters.get('impressions', 0), counters.get('taps', 0),
+                ])
+            cursor.execute(
+                f"INSERT INTO {quote(table)} "
+                f"({quote('message_id')}, {quote('app_id')}, {quote('hour')}, "
+                f"{quote('impressions')}, {quote('taps')}) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(batch))} "
+                f"ON CONFLICT ({quote('message_id')}, {quote('app_id')}, {quote('hour')}) DO UPDATE SET "
+                f"{quote('impressions')} = {quote(table)}.{quote('impressions')} + EXCLUDED.{quote('impressions')}, "
+                f"{quote('taps')} = {quote(table)}.{quote('taps')} + EXCLUDED.{quote('taps')}",
+                params
+            )
+
+
+def fold_events(instances):
+    """Add a list of saved impressions and taps to the rollups."""
+    counters = Counter(
+        (instance.message_id, instance.app_id, hour_bucket(instance.timestamp), COUNTER_FIELDS[type(instance)])
+        for instance in instances
+    )
+    counts = {}
+    for (message_id, app_id, hour, field), count in counters.items():
+        counts.setdefault((message_id, app_id, hour), {})[field] = count
+    fold_counts(counts)
+
+
+def annotate_totals(queryset):
+    """Annotate PulseMessages with impression_count and tap_count from the rollups."""
+    def total(field):
+        return Coalesce(
+            Subquery(
+                MessageStatsHourly.objects.filter(message=OuterRef('pk')).values('message').annotate(
+                    total=models.Sum(field)
+                ).values('total')
+            ),
+            0,
+            output_field=models.BigIntegerField(),
+        )
+
+    return queryset.annotate(impression_count=total('impressions'), tap_count=total('taps'))
+
+
+def time_series(bucket, start, end, app_ids=None, message_ids=None, after=None, limit=500):
+    """
+    Impressions and taps per (bucket, message, app) for hours in [start,
+    end), in one grouped query over the rollups, ordered by that key.
+    bucket is 'hour', 'day' or 'week' (weeks start on Monday, UTC). after
+    is the (bucket, message_id, app_id) key of the last row of the
+    previous page.
+    """
+    rows = MessageStatsHourly.objects.filter(hour__gte=start, hour__lt=end)
+    if app_ids:
+        rows = rows.filter(app_id__in=app_ids)
+    if message_ids:
+        rows = rows.filter(message_id__in=message_ids)
+    rows = rows.annotate(bucket=BUCKET_FUNCTIONS[bucket]('hour', tzinfo=dt_timezone.utc))
+    if after is not None:
+        after_bucket, after_message_id, after_app_id = after
+        # Rows before the cursor's bucket are skipped through the hour index.
+        rows = rows.filter(hour__gte=after_bucket).filter(
+            models.Q(bucket__gt=after_bucket)
+            | models.Q(bucket=after_bucket, message_id__gt=after_message_id)
+            | models.Q(bucket=after_bucket, message_id=after_message_id, app_id__gt=after_app_id)
+        )
+    return list(
+        rows.values('bucket', 'message_id', 'app_id').annotate(
+            impressions=models.Sum('impressions'),
+            taps=models.Sum('taps'),
+        ).order_by('bucket', 'message_id', 'app_id')[:limit]
+    )
+
+
+def message_totals(message_ids):
+    """Return {message_id: (impressions, taps)} for the given messages."""
+    rows = MessageStatsHourly.objects.filter(
+        message_id__in=message_ids
+    ).values('message_id').annotate(
+        impressions=models.Sum('impressions'),
+        taps=models.Sum('taps'),
+    ).order_by()
+    totals = dict.fromkeys(message_ids, (0, 0))
+    for row in rows:
+        totals[row['message_id']] = (row['impressions'], row['taps'])
+    return totals
+
+
+def rebuild_rollups(start=None, end=None):
+    """
+    Recompute rollups from the raw tables, for hours in [start, end) when
+    given (bounds are rounded down to the hour). Returns the number of
+    rollup rows written.
+
+    start defaults to the oldest raw event, so rollups for months whose
+    raw events were removed by retention are kept.
+    """
+    if start is None:
+        oldest = [
+            model.objects.aggregate(oldest=models.Min('timestamp'))['oldest']
+            for model in COUNTER_FIELDS
+        ]
+        oldest = [timestamp for timestamp in oldest if timestamp is not None]
+        if not oldest:
+            return 0
+        start = min(oldest)
+
+    hours = {'hour__gte': hour_bucket(start)}
+    timestamps = {'timestamp__gte': hour_bucket(start)}
+    if end is not None:
+        hours['hour__lt'] = timestamps['timestamp__lt'] = hour_bucket(end)
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Hold off concurrent folds until the rebuilt rows are committed,
+            # so events are neither lost nor counted twice.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"LOCK TABLE {connection.ops.quote_name(MessageStatsHourly._meta.db_table)} "
+                    "IN SHARE ROW EXCLUSIVE MODE"
+                )
+
+        counts = {}
+        for model, field in COUNTER_FIELDS.items():
+            rows = model.objects.filter(**timestamps).annotate(
+                hour=TruncHour('timestamp', tzinfo=dt_timezone.utc)
+            ).values('message_id', 'app_id', 'hour').annotate(
+                count=models.Count('id')
+            ).order_by()
+            for row in rows:
+                key = (row['message_id'], row['app_id'], row['hour'])
+                counts.setdefault(key, {})[field] = row['count']
+
+        MessageStatsHourly.objects.filter(**hours).delete()
+        MessageStatsHourly.objects.bulk_create(
+            [
+                MessageStatsHourly(
+                    message_id=message_id, app_id=app_id, hour=hour,
+                    impressions=counters.get('impressions', 0),
+                    taps=counters.get('taps', 0),
+                )
+                for (message_id, app_id, hour), counters in counts.items()
+            ],
+            batch_size=1000,
+        )
+    return len(counts)
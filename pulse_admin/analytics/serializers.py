@@ -0,0 +1,10 @@
+from rest_framework import serializers
+
+
+class EventSerializer(serializers.Serializer):
+    """One entry of a POST /api/events/ batch."""
+    type = serializers.ChoiceField(choices=['impression', 'tap'])
+    message_id = serializers.IntegerField(min_value=1)
+    app_id = serializers.CharField(max_length=50)
+    timestamp = serializers.DateTimeField(required=False)
+    event_id = serializers.UUIDField(required=False)
@@ -0,0 +1,249 @@
+"""
+Local append-only spool for analytics events ('spool' ingest mode).
+
+Event endpoints append JSON lines to a segment file in ANALYTICS_SPOOL_DIR
+and answer at once, so a slow or restarting database never holds up a
+gunicorn worker (and the feed requests queued behind it). Each process
+writes its own segments with single O_APPEND writes; a background thread
+fsyncs them every ANALYTICS_SPOOL_FSYNC_INTERVAL seconds, so one fsync
+covers every event appended in that interval. A segment is rotated once it
+reaches ANALYTICS_SPOOL_SEGMENT_BYTES or is ANALYTICS_SPOOL_SEGMENT_SECONDS
+old, so no segment is written to after its start time plus that age.
+
+The replayer (manage.py replay_spool) drains segments into the analytics
+tables with write_events() and records its byte offset per segment in a
+checkpoint file after every committed batch, so it resumes where it left
+off after a crash. Every spooled event carries an event_id, so a batch
+replayed twice (committed, then crashed before the checkpoint) is dropped
+by the deduplication in dedup.py instead of being counted again.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+
+from messages_app.publisher import write_atomic
+
+from .dedup import dedup_window, recorded_event_ids
+from .models import EVENT_MODELS
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = '.spool'
+CHECKPOINT_NAME = 'checkpoint.json'
+LOCK_NAME = 'replay.lock'
+EVENT_TYPES = {model: event_type for event_type, model in EVENT_MODELS.items()}
+
+
+def spool_dir():
+    return Path(getattr(settings, 'ANALYTICS_SPOOL_DIR', 'spool'))
+
+
+def segment_max_age():
+    return getattr(settings, 'ANALYTICS_SPOOL_SEGMENT_SECONDS', 60)
+
+
+def segment_started(path):
+    """Start time (epoch seconds) encoded in a segment's name."""
+    return int(path.name.split('-', 1)[0]) / 1000
+
+
+def encode_events(instances):
+    lines = []
+    for instance in instances:
+        if instance.event_id is None:
+            instance.event_id = uuid.uuid4()
+        lines.append(json.dumps({
+            'type': EVENT_TYPES[type(instance)],
+            'message_id': instance.message_id,
+            'app_id': instance.app_id,
+            'timestamp': instance.timestamp.isoformat(),
+            'event_id': str(instance.event_id),
+        }, separators=(',', ':')))
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def decode_event(line):
+    record = json.loads(line)
+    return EVENT_MODELS[record['type']](
+        message_id=record['message_id'],
+        app_id=record['app_id'],
+        timestamp=datetime.fromisoformat(record['timestamp']),
+        event_id=uuid.UUID(record['event_id']),
+    )
+
+
+class SpoolWriter:
+    """Appends events to this process's current segment."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fd = None
+        self.pid = None
+        self.started = 0
+        self.size = 0
+        self.dirty = False
+        self.thread = None
+
+    def append(self, instances):
+        data = encode_events(instances)
+        with self.lock:
+            self._ensure_segment()
+            os.write(self.fd, data)
+            self.size += len(data)
+            self.dirty = True
+
+    def _ensure_segment(self):
+        now = time.time()
+        if self.pid == os.getpid() and self.fd is not None and (
+            self.size < getattr(settings, 'ANALYTICS_SPOOL_SEGMENT_BYTES', 16 * 1024 * 1024)
+            and now - self.started < segment_max_age()
+        ):
+            return
+        if self.pid == os.getpid():
+            self._close()
+        else:
+            # Forked: the parent's segment and fsync thread are not ours.
+            self.thread = None
+        self.pid = os.getpid()
+
+        directory = spool_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f'{int(now * 1000):013d}-{socket.gethostname()}-{self.pid}{SEGMENT_SUFFIX}'
+        self.fd = os.open(directory / name, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.started = now
+        self.size = 0
+        if not (self.thread and self.thread.is_alive()):
+            self.thread = threading.Thread(target=self._run, name='analytics-spool-fsync', daemon=True)
+            self.thread.start()
+
+    def _close(self):
+        if self.fd is not None:
+            os.fsync(self.fd)
+            os.close(self.fd)
+            self.fd = None
+            self.dirty = False
+
+    def _run(self):
+        while True:
+            time.sleep(getattr(settings, 'ANALYTICS_SPOOL_FSYNC_INTERVAL', 0.2))
+            self.sync()
+
+    def sync(self):
+        """fsync everything appended since the last sync."""
+        with self.lock:
+            if not self.dirty or self.fd is None:
+                return
+            # A duplicate fd survives a rotation that closes the segment.
+            fd = os.dup(self.fd)
+            self.dirty = False
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+_writer = SpoolWriter()
+
+
+def spool_events(instances):
+    """Append unsaved impressions and taps to the spool."""
+    _writer.append(instances)
+
+
+class SpoolReplayer:
+    """
+    Drains spool segments into the database. Only one replayer runs per
+    spool directory; others wait on its lock file.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.directory = spool_dir()
+        self.checkpoint_path = self.directory / CHECKPOINT_NAME
+        self.lock_file = None
+
+    def lock(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.lock_file = open(self.directory / LOCK_NAME, 'w')
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+
+    def load_checkpoint(self):
+        try:
+            return json.loads(self.checkpoint_path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_checkpoint(self, checkpoint):
+        write_atomic(self.checkpoint_path, json.dumps(checkpoint).encode())
+
+    def replay(self):
+        """Replay every complete event in the spool. Returns the number written."""
+        checkpoint = self.load_checkpoint()
+        # Segments started before this can no longer be appended to.
+        closed_before = time.time() - segment_max_age() - 1
+        written = 0
+        for path in sorted(self.directory.glob(f'*{SEGMENT_SUFFIX}')):
+            offset = checkpoint.get(path.name, 0)
+            with open(path, 'rb') as segment:
+                segment.seek(offset)
+                while True:
+                    lines, consumed = self.read_batch(segment)
+                    if not consumed:
+                        break
+                    written += self.write_batch(lines, path.name)
+                    offset += consumed
+                    checkpoint[path.name] = offset
+                    self.save_checkpoint(checkpoint)
+
+            if segment_started(path) < closed_before:
+                # A closed segment ending without a newline was cut short
+                # by a crash mid-write; its last record is incomplete.
+                remaining = path.stat().st_size - offset
+                if remaining:
+                    logger.warning("Discarding %d bytes of incomplete spool record in %s", remaining, path.name)
+                path.unlink()
+                if checkpoint.pop(path.name, None) is not None:
+                    self.save_checkpoint(checkpoint)
+        return written
+
+    def read_batch(self, segment):
+        """Read up to batch_size complete lines; returns (lines, bytes consumed)."""
+        lines, consumed = [], 0
+        while len(lines) < self.batch_size:
+            line = segment.readline()
+            if not line.endswith(b'\n'):
+                # Nothing more, or a write still in progress: retry next time.
+                break
+            lines.append(line)
+            consumed += len(line)
+        return lines, consumed
+
+    def write_batch(self, lines, segment_name):
+        from .ingest import write_events
+
+        events = []
+        for line in lines:
+            try:
+                events.append(decode_event(line))
+            except (ValueError, KeyError, TypeError):
+                logger.error("Skipping malformed spool record in %s: %r", segment_name, line[:200])
+        if not events:
+            return 0
+
+        # Drop events a previous run committed before it could checkpoint.
+        recorded = recorded_event_ids(events, dedup_window())
+        events = [event for event in events if event.event_id not in recorded]
+        if events:
+            write_events(events)
+        return len(events)
+
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('events/', views.RecordEventsView.as_view(), name='record-events'),
+    path('analytics/', views.AnalyticsView.as_view(), name='analytics'),
+]
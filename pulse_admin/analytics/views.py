@@ -0,0 +1,199 @@
+import base64
+import hashlib
+import json
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
+from messages_app.authentication import requested_app_ids, token_scope
+from messages_app.feed import feed_etag, known_message_ids
+from messages_app.views import TokenValidationMixin
+from .dedup import find_duplicates
+from .ingest import record_events
+from .models import EVENT_MODELS
+from .rollups import BUCKET_FUNCTIONS, hour_bucket, time_series
+from .serializers import EventSerializer
+
+
+class RecordEventsView(TokenValidationMixin, APIView):
+    """
+    POST /api/events/?app_id=brighton&token=xxx
+    Records a JSON array of impression/tap events in one request.
+    Returns a result per event, in order.
+    """
+
+    def post(self, request):
+        self.validate_token(request)
+
+        events = request.data
+        max_events = getattr(settings, 'ANALYTICS_MAX_BATCH', 500)
+        if not isinstance(events, list) or not events:
+            return Response(
+                {"error": "Request body must be a non-empty JSON array of events"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(events) > max_events:
+            return Response(
+                {"error": f"At most {max_events} events per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = []
+        valid = []
+        for index, event in enumerate(events):
+            serializer = EventSerializer(data=event)
+            if serializer.is_valid():
+                results.append(None)
+                valid.append((index, serializer.validated_data))
+            else:
+                results.append({"status": "error", "errors": serializer.errors})
+
+        _, scope = token_scope(request.query_params.get('token'))
+        existing = known_message_ids()
+
+        now = timezone.now()
+        instances = []
+        accepted = []
+        for index, data in valid:
+            if scope is not None and data['app_id'] not in scope:
+                results[index] = {"status": "error", "error": "app_id not allowed for this token"}
+            elif existing is not None and data['message_id'] not in existing:
+                results[index] = {"status": "error", "error": "Message not found"}
+            else:
+                # Device clocks run ahead; never record events in the future.
+                timestamp = min(data.get('timestamp') or now, now)
+                instances.append(EVENT_MODELS[data['type']](
+                    message_id=data['message_id'],
+                    app_id=data['app_id'],
+                    timestamp=timestamp,
+                    event_id=data.get('event_id'),
+                ))
+                accepted.append(index)
+
+        # Retries of events that were already recorded succeed without a write.
+        duplicates = find_duplicates(instances)
+        fresh = [instance for position, instance in enumerate(instances) if position not in duplicates]
+        recorded = record_events(fresh) if fresh else True
+        for position, index in enumerate(accepted):
+            if position in duplicates:
+                results[index] = {"status": "duplicate"}
+            elif recorded:
+                results[index] = {"status": "recorded"}
+            else:
+                results[index] = {"status": "error", "error": "Event could not be recorded"}
+
+        return Response({
+            "recorded": len(fresh) if recorded else 0,
+            "results": results,
+        }, status=status.HTTP_200_OK)
+
+
+def parse_bound(value):
+    """Parse an ISO date or datetime query parameter (UTC when naive)."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+
+def encode_cursor(row):
+    key = [row['bucket'].isoformat(), row['message_id'], row['app_id']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    bucket, message_id, app_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(bucket), int(message_id), str(app_id)
+
+
+class AnalyticsView(TokenValidationMixin, APIView):
+    """
+    GET /api/analytics/?bucket=day&app_id=brighton&message_id=1&start=2025-01-01&token=xxx
+    Impressions, taps and CTR per time bucket, message and app, read from
+    the hourly rollups. Pages are keyset-paginated: pass `next` back as
+    ?cursor= for the following page. Rendered pages are cached for
+    ANALYTICS_API_CACHE_TIMEOUT seconds and carry an ETag.
+    """
+    default_ranges = {
+        'hour': timedelta(days=7),
+        'day': timedelta(days=30),
+        'week': timedelta(weeks=26),
+    }
+    default_limit = 500
+    max_limit = 5000
+
+    def get(self, request):
+        self.validate_token(request)
+        params = request.query_params
+
+        bucket = params.get('bucket', 'day')
+        if bucket not in BUCKET_FUNCTIONS:
+            return self.error(f"bucket must be one of: {', '.join(BUCKET_FUNCTIONS)}")
+        try:
+            limit = int(params.get('limit', self.default_limit))
+            message_ids = sorted({int(value) for value in params.getlist('message_id')})
+            # Default to the hour in progress, so the range (and cache key)
+            # stays the same for a whole hour.
+            end = parse_bound(params['end']) if params.get('end') else hour_bucket(timezone.now()) + timedelta(hours=1)
+            start = parse_bound(params['start']) if params.get('start') else end - self.default_ranges[bucket]
+        except ValueError:
+            return self.error("Invalid limit, message_id, start or end")
+        if not 1 <= limit <= self.max_limit:
+            return self.error(f"limit must be between 1 and {self.max_limit}")
+        if start >= end:
+            return self.error("start must be before end")
+        after = None
+        if params.get('cursor'):
+            try:
+                after = decode_cursor(params['cursor'])
+            except (ValueError, TypeError):
+                return self.error("Invalid cursor")
+
+        app_ids = sorted(set(requested_app_ids(params)))
+        key = json.dumps([bucket, start.isoformat(), end.isoformat(), app_ids, message_ids, params.get('cursor'), limit])
+        cache_key = f'pulse:analytics:{hashlib.sha256(key.encode()).hexdigest()}'
+        body = cache.get(cache_key)
+        if body is None:
+            rows = time_series(bucket, start, end, app_ids, message_ids, after, limit)
+            body = JSONRenderer().render({
+                'bucket': bucket,
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'results': [
+                    {
+                        'bucket': row['bucket'].isoformat(),
+                        'message_id': row['message_id'],
+                        'app_id': row['app_id'],
+                        'impressions': row['impressions'],
+                        'taps': row['taps'],
+                        'ctr': round(row['taps'] / row['impressions'] * 100, 2) if row['impressions'] else 0,
+                    }
+                    for row in rows
+                ],
+                'next': encode_cursor(rows[-1]) if len(rows) == limit else None,
+            })
+            cache.set(cache_key, body, getattr(settings, 'ANALYTICS_API_CACHE_TIMEOUT', 60))
+
+        etag = feed_etag(body)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type=JSONRenderer.media_type)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=getattr(settings, 'ANALYTICS_API_CACHE_TIMEOUT', 60))
+        return response
+
+    def error(self, message):
+        return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
@@ -4,7 +4,6 @@ from django.conf import settings
 from unfold.admin import ModelAdmin
 from .models import APIKey
 from .forms import APIKeyAdminForm
-from .encryption import decrypt_value
 
 
 @admin.register(APIKey)
@@ -85,14 +84,8 @@ class APIKeyAdmin(ModelAdmin):
     get_expiry_badge.short_description = 'Expiry'
 
     def get_masked_value(self, obj):
-        """Show only last 4 characters of the decrypted key."""
-        try:
-            value = decrypt_value(obj.encrypted_value)
-            if len(value) > 4:
-                return f"{'*' * 16}...{value[-4:]}"
-            return '*' * len(value)
-        except Exception:
-            return '(decryption error)'
+        """Show only last 4 characters of the key, stored when it was saved."""
+        return obj.masked_value or '-'
     get_masked_value.short_description = 'Key Value'
 
     def get_api_test_url(self, obj):
@@ -1,6 +1,8 @@
 """
 Encryption utilities for secure API key storage.
 Uses Fernet symmetric encryption (AES-128-CBC with HMAC).
+
+The cipher is built once per process and rebuilt when SECRET_KEY changes.
 """
 
 import base64
@@ -8,6 +10,10 @@ import hashlib
 
 from cryptography.fernet import Fernet
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+_fernet = None
 
 
 def get_encryption_key():
@@ -21,15 +27,35 @@ def get_encryption_key():
     return base64.urlsafe_b64encode(key_bytes)
 
 
+def get_fernet():
+    """Return the Fernet cipher for the current SECRET_KEY."""
+    global _fernet
+    if _fernet is None:
+        _fernet = Fernet(get_encryption_key())
+    return _fernet
+
+
+@receiver(setting_changed)
+def reset_fernet(setting, **kwargs):
+    global _fernet
+    if setting == 'SECRET_KEY':
+        _fernet = None
+
+
 def encrypt_value(plaintext: str) -> str:
     """Encrypt a plaintext string value."""
-    fernet = Fernet(get_encryption_key())
-    encrypted = fernet.encrypt(plaintext.encode())
+    encrypted = get_fernet().encrypt(plaintext.encode())
     return encrypted.decode()
 
 
 def decrypt_value(ciphertext: str) -> str:
     """Decrypt an encrypted value."""
-    fernet = Fernet(get_encryption_key())
-    decrypted = fernet.decrypt(ciphertext.encode())
+    decrypted = get_fernet().decrypt(ciphertext.encode())
     return decrypted.decode()
+
+
+def mask_value(plaintext: str) -> str:
+    """Non-secret display form of a value: only its last 4 characters."""
+    if len(plaintext) > 4:
+        return f"{'*' * 16}...{plaintext[-4:]}"
+    return '*' * len(plaintext)
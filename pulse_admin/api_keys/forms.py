@@ -1,6 +1,5 @@
 from django import forms
 from .models import APIKey
-from .encryption import encrypt_value
 
 
 class APIKeyAdminForm(forms.ModelForm):
@@ -43,7 +42,7 @@ class APIKeyAdminForm(forms.ModelForm):
 
         # Only update encrypted value if a new value was provided
         if key_value:
-            instance.encrypted_value = encrypt_value(key_value)
+            instance.set_value(key_value)
 
         if commit:
             instance.save()
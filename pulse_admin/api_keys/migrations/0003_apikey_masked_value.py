@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:01
+
+from django.db import migrations, models
+
+
+def backfill_masked_values(apps, schema_editor):
+    # Keys that no longer decrypt (SECRET_KEY changed) keep a blank mask.
+    from cryptography.fernet import InvalidToken
+
+    from api_keys.encryption import decrypt_value, mask_value
+
+    APIKey = apps.get_model('api_keys', 'APIKey')
+    keys = []
+    for key in APIKey.objects.only('pk', 'encrypted_value'):
+        try:
+            key.masked_value = mask_value(decrypt_value(key.encrypted_value))
+        except InvalidToken:
+            continue
+        keys.append(key)
+    APIKey.objects.bulk_update(keys, ['masked_value'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_keys', '0002_apikey_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='masked_value',
+            field=models.CharField(blank=True, editable=False, help_text='Masked key shown in the admin (last 4 characters only)', max_length=30),
+        ),
+        migrations.RunPython(backfill_masked_values, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.core.validators import RegexValidator
 from django.utils import timezone
 
+from .encryption import encrypt_value, mask_value
+
 
 class APIKey(models.Model):
     """Encrypted storage for third-party API keys."""
@@ -27,6 +29,12 @@ class APIKey(models.Model):
     encrypted_value = models.TextField(
         help_text="The encrypted API key value"
     )
+    masked_value = models.CharField(
+        max_length=30,
+        blank=True,
+        editable=False,
+        help_text="Masked key shown in the admin (last 4 characters only)"
+    )
     is_active = models.BooleanField(
         default=True,
         help_text="Inactive keys will not be returned by the API"
@@ -66,6 +74,11 @@ class APIKey(models.Model):
             return f"{self.name} ({self.service_name})"
         return self.name
 
+    def set_value(self, plaintext):
+        """Encrypt plaintext into encrypted_value and store its masked form."""
+        self.encrypted_value = encrypt_value(plaintext)
+        self.masked_value = mask_value(plaintext)
+
     @property
     def is_expired(self):
         """Check if the key has expired."""
@@ -1,13 +1,19 @@
-import csv
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponseRedirect
 from django.contrib import messages
+from django.contrib.admin import helpers
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.template.response import TemplateResponse
 from unfold.admin import ModelAdmin
 from .models import PulseMessage, TargetApp
-from .forms import PulseMessageAdminForm
+from .forms import PriorityForm, PulseMessageAdminForm, ScheduleWindowForm
+from .feed import invalidate_feeds
+from analytics.exports import EXPORT_CHUNK_SIZE, stream_csv
+from analytics.rollups import annotate_totals, message_totals
 
 
 admin.site.site_header = "Eventstream Pulse Admin"
@@ -37,6 +43,7 @@ class PulseMessageAdmin(ModelAdmin):
         'end_date',
         'get_impressions_count',
         'get_taps_count',
+        'get_ctr',
         'get_test_link',
     )
     list_filter = (
@@ -56,6 +63,8 @@ class PulseMessageAdmin(ModelAdmin):
         'activate_messages',
         'deactivate_messages',
         'target_all_apps',
+        'set_schedule_window',
+        'set_priority',
         'export_to_csv',
     ]
 
@@ -100,6 +109,16 @@ class PulseMessageAdmin(ModelAdmin):
         }
         js = ('admin/js/message_preview.js',)
 
+    def get_queryset(self, request):
+        # Counts come from rollup subqueries and target apps from one
+        # prefetch, so the changelist runs a fixed number of queries.
+        queryset = annotate_totals(super().get_queryset(request).prefetch_related('target_apps'))
+        return queryset.annotate(ctr=Case(
+            When(impression_count__gt=0, then=F('tap_count') * 100.0 / F('impression_count')),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
+
     def get_status_badge(self, obj):
         if obj.is_currently_active():
             return format_html(
@@ -124,31 +143,46 @@ class PulseMessageAdmin(ModelAdmin):
     get_status_badge.short_description = 'Status'
 
     def get_target_apps_display(self, obj):
-        apps = obj.target_apps.all()[:3]
-        count = obj.target_apps.count()
-        display = ', '.join([a.app_name for a in apps])
+        apps = list(obj.target_apps.all())
+        count = len(apps)
+        display = ', '.join([a.app_name for a in apps[:3]])
         if count > 3:
             display += f' (+{count - 3} more)'
         return display or '-'
     get_target_apps_display.short_description = 'Target Apps'
 
+    def get_analytics_totals(self, obj):
+        """(impressions, taps) from the get_queryset() annotations or the rollups."""
+        if hasattr(obj, 'impression_count'):
+            return obj.impression_count, obj.tap_count
+        if not hasattr(obj, '_analytics_totals'):
+            obj._analytics_totals = message_totals([obj.pk])[obj.pk]
+        return obj._analytics_totals
+
     def get_impressions_count(self, obj):
-        return obj.impressions.count()
+        return self.get_analytics_totals(obj)[0]
     get_impressions_count.short_description = 'Impressions'
+    get_impressions_count.admin_order_field = 'impression_count'
 
     def get_taps_count(self, obj):
-        return obj.taps.count()
+        return self.get_analytics_totals(obj)[1]
     get_taps_count.short_description = 'Taps'
+    get_taps_count.admin_order_field = 'tap_count'
+
+    def get_ctr(self, obj):
+        return f'{obj.ctr:.2f}%'
+    get_ctr.short_description = 'CTR'
+    get_ctr.admin_order_field = 'ctr'
 
     def get_analytics_summary(self, obj):
-        impressions = obj.impressions.count()
-        taps = obj.taps.count()
+        impressions, taps = self.get_analytics_totals(obj)
         ctr = (taps / impressions * 100) if impressions > 0 else 0
+        # format_html() escapes its arguments to strings, so format CTR first.
         return format_html(
             '<strong>Impressions:</strong> {}<br>'
             '<strong>Taps:</strong> {}<br>'
-            '<strong>CTR:</strong> {:.2f}%',
-            impressions, taps, ctr
+            '<strong>CTR:</strong> {}%',
+            impressions, taps, f'{ctr:.2f}'
         )
     get_analytics_summary.short_description = 'Analytics Summary'
 
@@ -161,7 +195,7 @@ class PulseMessageAdmin(ModelAdmin):
 
     def get_test_link(self, obj):
         """Show a test link in list view."""
-        first_app = obj.target_apps.first()
+        first_app = next(iter(obj.target_apps.all()), None)
         if first_app:
             token = getattr(settings, 'API_TOKEN', 'pulse_dev_token')
             return format_html(
@@ -195,34 +229,39 @@ class PulseMessageAdmin(ModelAdmin):
 
     # --- Admin actions ---
 
+    # Actions write with bulk_create()/update() in a fixed number of
+    # queries, which skips signals, so they invalidate feeds themselves.
+
     @admin.action(description="Duplicate selected messages (as draft)")
     def duplicate_messages(self, request, queryset):
-        duplicated = 0
-        for message in queryset:
-            # Get target apps before clearing pk
-            target_apps = list(message.target_apps.all())
-
-            # Create duplicate
-            message.pk = None
-            message.id = None
-            message.title = f"Copy of {message.title}"[:100]
-            message.is_active = False  # Always create as draft
-            message.created_by = request.user
-            message.save()
-
-            # Restore target apps
-            message.target_apps.set(target_apps)
-            duplicated += 1
+        Targeting = PulseMessage.target_apps.through
+        with transaction.atomic():
+            copies = list(queryset.prefetch_related('target_apps'))
+            target_app_ids = [[app.pk for app in message.target_apps.all()] for message in copies]
+            for message in copies:
+                message.pk = None
+                message._state.adding = True
+                message.title = f"Copy of {message.title}"[:100]
+                message.is_active = False  # Always create as draft
+                message.created_by = request.user
+            PulseMessage.objects.bulk_create(copies)
+            Targeting.objects.bulk_create([
+                Targeting(pulsemessage_id=message.pk, targetapp_id=app_id)
+                for message, app_ids in zip(copies, target_app_ids)
+                for app_id in app_ids
+            ])
+        invalidate_feeds()  # bulk_create() bypasses post_save
 
         self.message_user(
             request,
-            f"Successfully duplicated {duplicated} message(s) as drafts.",
+            f"Successfully duplicated {len(copies)} message(s) as drafts.",
             messages.SUCCESS
         )
 
     @admin.action(description="Activate selected messages")
     def activate_messages(self, request, queryset):
         updated = queryset.update(is_active=True)
+        invalidate_feeds()  # update() bypasses post_save
         self.message_user(
             request,
             f"Successfully activated {updated} message(s).",
@@ -232,6 +271,7 @@ class PulseMessageAdmin(ModelAdmin):
     @admin.action(description="Deactivate selected messages")
     def deactivate_messages(self, request, queryset):
         updated = queryset.update(is_active=False)
+        invalidate_feeds()  # update() bypasses post_save
         self.message_user(
             request,
             f"Successfully deactivated {updated} message(s).",
@@ -240,64 +280,126 @@ class PulseMessageAdmin(ModelAdmin):
 
     @admin.action(description="Target all apps for selected messages")
     def target_all_apps(self, request, queryset):
-        all_apps = TargetApp.objects.filter(is_active=True)
-        for message in queryset:
-            message.target_apps.set(all_apps)
+        Targeting = PulseMessage.target_apps.through
+        with transaction.atomic():
+            message_ids = list(queryset.values_list('pk', flat=True))
+            app_ids = list(TargetApp.objects.filter(is_active=True).values_list('pk', flat=True))
+            # Same result as target_apps.set(all_apps) on each message.
+            Targeting.objects.filter(pulsemessage_id__in=message_ids).exclude(targetapp_id__in=app_ids).delete()
+            Targeting.objects.bulk_create(
+                [
+                    Targeting(pulsemessage_id=message_id, targetapp_id=app_id)
+                    for message_id in message_ids
+                    for app_id in app_ids
+                ],
+                ignore_conflicts=True,
+            )
+        invalidate_feeds()
         self.message_user(
             request,
-            f"Successfully set all apps as targets for {queryset.count()} message(s).",
+            f"Successfully set all apps as targets for {len(message_ids)} message(s).",
+            messages.SUCCESS
+        )
+
+    def bulk_edit_form(self, request, queryset, form_class, action, title):
+        """
+        Return (form, response): a valid form once the intermediate page was
+        submitted, otherwise the page to render for the selected messages.
+        """
+        form = form_class(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            return form, None
+        context = {
+            **self.admin_site.each_context(request),
+            'title': title,
+            'opts': self.model._meta,
+            'queryset': queryset,
+            'form': form,
+            'action': action,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'media': self.media + form.media,
+        }
+        return form, TemplateResponse(request, 'admin/messages_app/pulsemessage/bulk_edit.html', context)
+
+    @admin.action(description="Set schedule window for selected messages")
+    def set_schedule_window(self, request, queryset):
+        form, response = self.bulk_edit_form(
+            request, queryset, ScheduleWindowForm, 'set_schedule_window', "Set schedule window"
+        )
+        if response:
+            return response
+        updated = queryset.update(
+            start_date=form.cleaned_data['start_date'],
+            end_date=form.cleaned_data['end_date'],
+            updated_at=timezone.now(),
+        )
+        invalidate_feeds()  # update() bypasses post_save
+        self.message_user(
+            request,
+            f"Successfully rescheduled {updated} message(s).",
+            messages.SUCCESS
+        )
+
+    @admin.action(description="Set priority for selected messages")
+    def set_priority(self, request, queryset):
+        form, response = self.bulk_edit_form(request, queryset, PriorityForm, 'set_priority', "Set priority")
+        if response:
+            return response
+        updated = queryset.update(priority=form.cleaned_data['priority'], updated_at=timezone.now())
+        invalidate_feeds()  # update() bypasses post_save
+        self.message_user(
+            request,
+            f"Successfully set the priority of {updated} message(s).",
             messages.SUCCESS
         )
 
     @admin.action(description="Export selected messages to CSV")
     def export_to_csv(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="pulse_messages.csv"'
+        messages_qs = annotate_totals(
+            queryset.select_related('created_by').prefetch_related('target_apps')
+        )
 
-        writer = csv.writer(response)
-        writer.writerow([
+        def rows():
+            for msg in messages_qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                impressions, taps = msg.impression_count, msg.tap_count
+                ctr = (taps / impressions * 100) if impressions > 0 else 0
+
+                # Determine status
+                if msg.is_currently_active():
+                    status = 'LIVE'
+                elif not msg.is_active:
+                    status = 'DRAFT'
+                elif msg.start_date > timezone.now():
+                    status = 'SCHEDULED'
+                else:
+                    status = 'ENDED'
+
+                yield [
+                    msg.id,
+                    msg.title,
+                    msg.body,
+                    msg.get_message_type_display(),
+                    msg.priority,
+                    msg.is_active,
+                    status,
+                    ', '.join(msg.target_app_ids),
+                    msg.start_date.strftime('%Y-%m-%d %H:%M') if msg.start_date else '',
+                    msg.end_date.strftime('%Y-%m-%d %H:%M') if msg.end_date else '',
+                    impressions,
+                    taps,
+                    f"{ctr:.2f}",
+                    msg.cta_text or '',
+                    msg.cta_action or '',
+                    msg.image_url or '',
+                    msg.created_at.strftime('%Y-%m-%d %H:%M'),
+                    msg.created_by.username if msg.created_by else ''
+                ]
+
+        return stream_csv('pulse_messages.csv', [
             'ID', 'Title', 'Body', 'Message Type', 'Priority',
             'Is Active', 'Status', 'Target Apps',
             'Start Date', 'End Date',
             'Impressions', 'Taps', 'CTR %',
             'CTA Text', 'CTA Action', 'Image URL',
             'Created At', 'Created By'
-        ])
-
-        for msg in queryset:
-            impressions = msg.impressions.count()
-            taps = msg.taps.count()
-            ctr = (taps / impressions * 100) if impressions > 0 else 0
-
-            # Determine status
-            if msg.is_currently_active():
-                status = 'LIVE'
-            elif not msg.is_active:
-                status = 'DRAFT'
-            elif msg.start_date > timezone.now():
-                status = 'SCHEDULED'
-            else:
-                status = 'ENDED'
-
-            writer.writerow([
-                msg.id,
-                msg.title,
-                msg.body,
-                msg.get_message_type_display(),
-                msg.priority,
-                msg.is_active,
-                status,
-                ', '.join(msg.target_app_ids),
-                msg.start_date.strftime('%Y-%m-%d %H:%M') if msg.start_date else '',
-                msg.end_date.strftime('%Y-%m-%d %H:%M') if msg.end_date else '',
-                impressions,
-                taps,
-                f"{ctr:.2f}",
-                msg.cta_text or '',
-                msg.cta_action or '',
-                msg.image_url or '',
-                msg.created_at.strftime('%Y-%m-%d %H:%M'),
-                msg.created_by.username if msg.created_by else ''
-            ])
-
-        return response
+        ], rows())
@@ -5,3 +5,6 @@ class MessagesAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'messages_app'
     verbose_name = 'In-App Messages'
+
+    def ready(self):
+        from . import signals  # noqa: F401
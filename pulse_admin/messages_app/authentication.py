@@ -0,0 +1,98 @@
+"""
+API token checks shared by the early-reject middleware and the API views.
+
+API_TOKEN grants access to every app; API_APP_TOKENS grants tokens scoped to
+single apps. Both are loaded once into an in-memory table keyed by the
+SHA-256 digest of the token, so checking a token never compares secrets
+with a short-circuiting ==.
+"""
+
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+
+AUTHENTICATION_FAILED = "Authentication failed. Invalid token."
+
+_token_table = None
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode()).digest()
+
+
+def get_token_table():
+    """Map token digest to the frozenset of app IDs it may access (None: all)."""
+    global _token_table
+    if _token_table is None:
+        scopes = {}
+        for app_id, token in getattr(settings, 'API_APP_TOKENS', {}).items():
+            scopes.setdefault(token, set()).add(app_id)
+        table = {_digest(token): frozenset(app_ids) for token, app_ids in scopes.items()}
+        table[_digest(getattr(settings, 'API_TOKEN', 'pulse_dev_token'))] = None
+        _token_table = table
+    return _token_table
+
+
+@receiver(setting_changed)
+def reset_token_table(setting, **kwargs):
+    global _token_table
+    if setting in ('API_TOKEN', 'API_APP_TOKENS'):
+        _token_table = None
+
+
+def requested_app_ids(params):
+    """App IDs a request targets, from its app_id and app_ids parameters."""
+    app_ids = [value for value in params.getlist('app_id') if value]
+    for value in params.getlist('app_ids'):
+        app_ids.extend(app_id for app_id in value.split(',') if app_id)
+    return app_ids
+
+
+def token_scope(token):
+    """
+    Return (known, scope) for a token, where scope is the frozenset of app
+    IDs it may access or None for every app.
+    """
+    if not token:
+        return False, None
+    digest = _digest(token)
+    table = get_token_table()
+    match = next((known for known in table if hmac.compare_digest(known, digest)), None)
+    if match is None:
+        return False, None
+    return True, table[match]
+
+
+def is_authorized(token, app_ids):
+    """
+    True if token is known and may access every app in app_ids. Scoped
+    tokens must name at least one app, which keeps them off app-less
+    endpoints such as /api/keys/.
+    """
+    known, scope = token_scope(token)
+    if not known:
+        return False
+    return scope is None or (bool(app_ids) and scope.issuperset(app_ids))
+
+
+class APITokenMiddleware:
+    """
+    Rejects API requests with a missing, unknown or out-of-scope token
+    before the session, CSRF and auth middleware (or any query) run.
+    Place it directly after CorsMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = getattr(settings, 'API_TOKEN_PATH_PREFIX', '/api/')
+
+    def __call__(self, request):
+        if request.path.startswith(self.prefix):
+            if not is_authorized(request.GET.get('token'), requested_app_ids(request.GET)):
+                return JsonResponse({"detail": AUTHENTICATION_FAILED}, status=403)
+            request.api_token_checked = True
+        return self.get_response(request)
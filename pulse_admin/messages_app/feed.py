@@ -0,0 +1,370 @@
+"""
+Per-app cache of the serialized message feed served by ActiveMessagesView.
+
+Feeds are stored under a key that embeds a shared "generation" token. Any
+change to messages, target apps or their targeting replaces the token (see
+signals.py), which orphans every cached feed at once without having to work
+out which apps a change touched.
+
+Between changes a feed only goes stale when one of its messages starts or
+ends, so each entry expires at the app's next schedule transition.
+
+Each entry also holds the feed pre-rendered to JSON bytes. With
+FEED_FAST_PATH enabled the messages are projected straight from .values()
+rows in the shape PulseMessageSerializer produces, so neither the
+serializer nor the renderer run on the request path.
+
+Alongside each feed a small "meta" entry holds its ETag (a hash of the
+rendered body) so conditional requests can be answered without loading or
+rebuilding the feed itself.
+
+Every newly built feed version is also appended to a bounded per-app change
+log of per-message digests. Clients that send back a version still in the
+log get only the messages that changed since, plus the IDs removed.
+"""
+
+import hashlib
+import logging
+import math
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, models, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from django.utils.http import quote_etag
+from rest_framework.fields import DateTimeField
+from rest_framework.renderers import JSONRenderer
+
+from .models import PulseMessage, TargetApp
+
+logger = logging.getLogger(__name__)
+
+GENERATION_CACHE_KEY = 'pulse:feed:generation'
+FEED_CACHE_KEY = 'pulse:feed:{generation}:{app_id}'
+FEED_META_CACHE_KEY = 'pulse:feed:{generation}:{app_id}:meta'
+# Outlives generations: deltas must span invalidations.
+CHANGE_LOG_CACHE_KEY = 'pulse:feed:changes:{app_id}'
+
+# Sent after commit once cached feeds have been dropped.
+feeds_invalidated = Signal()
+
+# Model fields emitted by PulseMessageSerializer, in its field order; the
+# two computed fields are filled in by project_feeds().
+FEED_FIELDS = [
+    'id', 'title', 'body', 'image_url', 'cta_text', 'cta_action',
+    'message_type', 'banner_position', 'priority', 'is_dismissible',
+    'background_color', 'title_color', 'body_color', 'button_color',
+    'button_text_color', 'target_app_ids', 'start_date', 'end_date',
+    'is_currently_active', 'created_at', 'updated_at',
+]
+DATETIME_FIELDS = ('start_date', 'end_date', 'created_at', 'updated_at')
+
+
+def active_messages(app_id, now=None):
+    """
+    Queryset of messages currently live for an app, with target apps
+    prefetched in one extra query for the whole feed.
+    """
+    now = now or timezone.now()
+    return PulseMessage.objects.filter(
+        is_active=True,
+        start_date__lte=now,
+        target_apps__app_id=app_id
+    ).filter(
+        models.Q(end_date__isnull=True) | models.Q(end_date__gt=now)
+    ).order_by('priority', '-start_date').distinct().prefetch_related(
+        models.Prefetch('target_apps', queryset=TargetApp.objects.only('app_id'))
+    )
+
+
+def next_transitions(app_ids, now=None):
+    """Like next_transition() for several apps in one grouped query."""
+    now = now or timezone.now()
+    rows = PulseMessage.objects.filter(
+        is_active=True,
+        target_apps__app_id__in=app_ids,
+    ).values('target_apps__app_id').annotate(
+        next_start=models.Min('start_date', filter=models.Q(start_date__gt=now)),
+        next_end=models.Min('end_date', filter=models.Q(end_date__gt=now)),
+    ).order_by()
+    transitions = dict.fromkeys(app_ids)
+    for row in rows:
+        candidates = [row[name] for name in ('next_start', 'next_end') if row[name] is not None]
+        if candidates:
+            transitions[row['target_apps__app_id']] = min(candidates)
+    return transitions
+
+
+def next_transition(app_id=None, now=None):
+    """
+    Return the next moment a feed changes on its own: the earliest future
+    start_date or end_date among active messages. Covers every app when
+    app_id is None. Returns None if nothing is scheduled.
+    """
+    now = now or timezone.now()
+    queryset = PulseMessage.objects.filter(is_active=True)
+    if app_id is not None:
+        queryset = queryset.filter(target_apps__app_id=app_id)
+    bounds = queryset.aggregate(
+        next_start=models.Min('start_date', filter=models.Q(start_date__gt=now)),
+        next_end=models.Min('end_date', filter=models.Q(end_date__gt=now)),
+    )
+    candidates = [value for value in bounds.values() if value is not None]
+    return min(candidates) if candidates else None
+
+
+def seconds_until(moment, now=None):
+    """Whole seconds until moment (at least 1), or None if moment is None."""
+    if moment is None:
+        return None
+    now = now or timezone.now()
+    return max(1, math.ceil((moment - now).total_seconds()))
+
+
+def get_generation():
+    """Return the current feed generation token, creating one if missing."""
+    generation = cache.get(GENERATION_CACHE_KEY)
+    if generation is None:
+        cache.add(GENERATION_CACHE_KEY, uuid.uuid4().hex, None)
+        generation = cache.get(GENERATION_CACHE_KEY)
+    return generation
+
+
+_message_ids = (None, frozenset())
+
+
+def known_message_ids():
+    """
+    Per-process set of every PulseMessage ID, used to validate analytics
+    events without a query. Reloaded whenever the feed generation changes,
+    i.e. after any message is created, edited or deleted.
+
+    In 'spool' ingest mode events must keep being accepted while the
+    database is down, so if the reload fails the last loaded set is
+    returned, or None (accept any ID) if none was loaded yet; replay drops
+    events for messages that do not exist.
+    """
+    global _message_ids
+    generation = get_generation()
+    loaded_generation, message_ids = _message_ids
+    if loaded_generation != generation:
+        try:
+            message_ids = frozenset(PulseMessage.objects.values_list('id', flat=True))
+        except DatabaseError:
+            if getattr(settings, 'ANALYTICS_INGEST_MODE', 'direct') != 'spool':
+                raise
+            logger.warning("Could not reload message IDs; validating events against the last loaded set")
+            return message_ids if loaded_generation is not None else None
+        _message_ids = (generation, message_ids)
+    return message_ids
+
+
+def project_feeds(app_ids, now=None):
+    """
+    Build serializer-shaped message dicts for several apps at once.
+
+    Live messages are read in one query over the target_apps through table
+    and grouped per app in Python; one more query collects the full
+    target_app_ids of those messages. Returns {app_id: [message, ...]}.
+    """
+    now = now or timezone.now()
+    through = PulseMessage.target_apps.through
+    computed = ('target_app_ids', 'is_currently_active')
+    columns = [name for name in FEED_FIELDS if name not in computed]
+
+    rows = through.objects.filter(
+        targetapp__app_id__in=app_ids,
+        pulsemessage__is_active=True,
+        pulsemessage__start_date__lte=now,
+    ).filter(
+        models.Q(pulsemessage__end_date__isnull=True)
+        | models.Q(pulsemessage__end_date__gt=now)
+    ).order_by(
+        'pulsemessage__priority', '-pulsemessage__start_date'
+    ).values_list('targetapp__app_id', *['pulsemessage__' + name for name in columns])
+
+    datetime_field = DateTimeField()
+    messages_by_id = {}
+    feeds = {app_id: [] for app_id in app_ids}
+    for app_id, *values in rows:
+        row = dict(zip(columns, values))
+        message = messages_by_id.get(row['id'])
+        if message is None:
+            row['is_currently_active'] = (
+                row['start_date'] <= now
+                and (row['end_date'] is None or row['end_date'] >= now)
+            )
+            for name in DATETIME_FIELDS:
+                if row[name] is not None:
+                    row[name] = datetime_field.to_representation(row[name])
+            row['target_app_ids'] = []
+            message = messages_by_id[row['id']] = {name: row[name] for name in FEED_FIELDS}
+        feeds[app_id].append(message)
+
+    # Same order as the target_apps relation (TargetApp.Meta.ordering).
+    links = through.objects.filter(
+        pulsemessage_id__in=messages_by_id
+    ).order_by('targetapp__app_name').values_list('pulsemessage_id', 'targetapp__app_id')
+    for message_id, target_app_id in links:
+        messages_by_id[message_id]['target_app_ids'].append(target_app_id)
+    return feeds
+
+
+def build_feeds(app_ids, now=None):
+    """Serialize the live messages for each app: {app_id: [message, ...]}."""
+    if getattr(settings, 'FEED_FAST_PATH', True):
+        return project_feeds(app_ids, now)
+
+    from .serializers import PulseMessageSerializer
+
+    return {
+        app_id: [
+            dict(item) for item in
+            PulseMessageSerializer(active_messages(app_id, now), many=True).data
+        ]
+        for app_id in app_ids
+    }
+
+
+def render_feed(messages):
+    """Render serialized messages to the bytes JSONRenderer would send."""
+    return JSONRenderer().render(messages)
+
+
+def feed_etag(body):
+    """Strong ETag for a rendered feed."""
+    return quote_etag(hashlib.sha256(body).hexdigest()[:32])
+
+
+def feed_version(etag):
+    """The feed version clients pass back as ?since=, i.e. the bare ETag."""
+    return etag.strip('"')
+
+
+def message_digests(messages):
+    """Map message ID to a short hash of its serialized form."""
+    return {
+        message['id']: hashlib.sha256(render_feed(message)).hexdigest()[:16]
+        for message in messages
+    }
+
+
+def record_feed_version(app_id, feed):
+    """
+    Append a feed version to the app's change log if it is new. The log
+    expires FEED_CHANGE_LOG_TIMEOUT seconds after its last version, since
+    app_id comes from the client and need not be a known app.
+    """
+    key = CHANGE_LOG_CACHE_KEY.format(app_id=app_id)
+    version = feed_version(feed['etag'])
+    log = cache.get(key) or []
+    if log and log[-1]['version'] == version:
+        return
+    log.append({'version': version, 'digests': message_digests(feed['messages'])})
+    cache.set(
+        key,
+        log[-getattr(settings, 'FEED_CHANGE_LOG_SIZE', 20):],
+        getattr(settings, 'FEED_CHANGE_LOG_TIMEOUT', 86400),
+    )
+
+
+def get_feed_changes(app_id, since, feed):
+    """
+    Return the changes between version since and the current feed as
+    {'changed': [message, ...], 'removed': [id, ...]}, or None when since is
+    no longer in the change log and a full snapshot is needed.
+    """
+    if since == feed_version(feed['etag']):
+        return {'changed': [], 'removed': []}
+
+    log = cache.get(CHANGE_LOG_CACHE_KEY.format(app_id=app_id)) or []
+    previous = next((entry['digests'] for entry in log if entry['version'] == since), None)
+    if previous is None:
+        return None
+
+    current = message_digests(feed['messages'])
+    return {
+        'changed': [
+            message for message in feed['messages']
+            if previous.get(message['id']) != current[message['id']]
+        ],
+        'removed': [message_id for message_id in previous if message_id not in current],
+    }
+
+
+def get_feed_meta(app_id):
+    """
+    Return the cached 'etag' and 'expires_at' of an app's feed without
+    loading the feed, or None if it is not cached.
+    """
+    return cache.get(
+        FEED_META_CACHE_KEY.format(generation=get_generation(), app_id=app_id)
+    )
+
+
+def get_feeds(app_ids):
+    """
+    Return cached feed entries for several apps as {app_id: entry},
+    building all missing ones together.
+
+    Each entry is a dict with the serialized 'messages', the rendered JSON
+    'body', its 'etag' and 'expires_at', the next schedule transition for
+    the app (None if nothing is scheduled).
+    """
+    generation = get_generation()
+    keys = {
+        app_id: FEED_CACHE_KEY.format(generation=generation, app_id=app_id)
+        for app_id in app_ids
+    }
+    cached = cache.get_many(keys.values())
+    feeds = {
+        app_id: cached[key] for app_id, key in keys.items() if key in cached
+    }
+
+    missing = [app_id for app_id in keys if app_id not in feeds]
+    if missing:
+        now = timezone.now()
+        built = build_feeds(missing, now)
+        transitions = next_transitions(missing, now)
+        for app_id in missing:
+            body = render_feed(built[app_id])
+            meta = {
+                'etag': feed_etag(body),
+                'expires_at': transitions[app_id],
+            }
+            feeds[app_id] = dict(meta, messages=built[app_id], body=body)
+            record_feed_version(app_id, feeds[app_id])
+
+            timeout = getattr(settings, 'FEED_CACHE_TIMEOUT', 3600)
+            remaining = seconds_until(meta['expires_at'], now)
+            if remaining is not None:
+                timeout = min(timeout, remaining)
+            cache.set_many({
+                keys[app_id]: feeds[app_id],
+                FEED_META_CACHE_KEY.format(generation=generation, app_id=app_id): meta,
+            }, timeout)
+    return feeds
+
+
+def get_feed(app_id):
+    """Return the cached feed entry for one app (see get_feeds())."""
+    return get_feeds([app_id])[app_id]
+
+
+def _drop_feeds():
+    cache.set(GENERATION_CACHE_KEY, uuid.uuid4().hex, None)
+    feeds_invalidated.send_robust(sender=None)
+
+
+def invalidate_feeds():
+    """
+    Drop every cached feed once the current transaction commits, then send
+    feeds_invalidated. Repeated calls in one transaction (a message save
+    plus its target_apps.set()) do this once.
+    """
+    connection = transaction.get_connection()
+    if any(func is _drop_feeds for _, func, _ in connection.run_on_commit):
+        return
+    transaction.on_commit(_drop_feeds)
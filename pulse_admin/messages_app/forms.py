@@ -1,4 +1,5 @@
 from django import forms
+from unfold.widgets import UnfoldAdminSelectWidget, UnfoldAdminSplitDateTimeWidget
 from .models import PulseMessage
 
 
@@ -24,3 +25,32 @@ class PulseMessageAdminForm(forms.ModelForm):
             'button_color': ColorWidget(),
             'button_text_color': ColorWidget(),
         }
+
+
+class ScheduleWindowForm(forms.Form):
+    """Bulk edit of the schedule window (set_schedule_window action)."""
+    start_date = forms.SplitDateTimeField(
+        widget=UnfoldAdminSplitDateTimeWidget,
+        help_text="When to start showing the messages"
+    )
+    end_date = forms.SplitDateTimeField(
+        required=False,
+        widget=UnfoldAdminSplitDateTimeWidget,
+        help_text="When to stop showing (leave blank for no end)"
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date, end_date = cleaned_data.get('start_date'), cleaned_data.get('end_date')
+        if start_date and end_date and end_date <= start_date:
+            raise forms.ValidationError("The end date must be after the start date.")
+        return cleaned_data
+
+
+class PriorityForm(forms.Form):
+    """Bulk edit of the priority (set_priority action)."""
+    priority = forms.TypedChoiceField(
+        choices=PulseMessage.PRIORITY_LEVELS,
+        coerce=int,
+        widget=UnfoldAdminSelectWidget
+    )
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from messages_app.feed import next_transition, seconds_until
+from messages_app.publisher import publish_feeds, publishing_enabled
+
+
+class Command(BaseCommand):
+    help = 'Write every app feed to FEED_PUBLISH_ROOT for nginx to serve'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running and republish at every message start/end boundary',
+        )
+
+    def handle(self, *args, **options):
+        if not publishing_enabled():
+            raise CommandError('FEED_PUBLISH_ROOT is not set.')
+
+        while True:
+            changed = publish_feeds()
+            self.stdout.write(self.style.SUCCESS(f'Published {changed} changed feed(s).'))
+            if not options['watch']:
+                return
+
+            # Wake just past the next boundary; message edits are published
+            # by the web service as they happen.
+            interval = getattr(settings, 'FEED_PUBLISH_INTERVAL', 300)
+            remaining = seconds_until(next_transition())
+            if remaining is not None:
+                interval = min(interval, remaining + 1)
+            time.sleep(interval)
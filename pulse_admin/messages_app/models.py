@@ -214,5 +214,8 @@ class PulseMessage(models.Model):
 
     @property
     def target_app_ids(self):
-        """Return list of app IDs this message targets."""
-        return list(self.target_apps.values_list('app_id', flat=True))
+        """
+        Return list of app IDs this message targets.
+        Uses prefetched target_apps when available.
+        """
+        return [app.app_id for app in self.target_apps.all()]
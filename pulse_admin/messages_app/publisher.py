@@ -0,0 +1,116 @@
+"""
+Static feed publisher.
+
+Writes each app's current feed to FEED_PUBLISH_ROOT as <app_id>.json (the
+same bytes GET /api/messages/ returns) with a precompressed .json.gz next to
+it, plus an index.json manifest of versions. nginx serves the directory
+directly, so feed reads never reach gunicorn or Postgres and keep working
+while the app server is down.
+
+Feeds are built straight from the database rather than through the feed
+cache: the publisher runs in its own process (the publisher service), and
+a feed cached there before an admin edit would otherwise be written back
+over the newer file the web service just published.
+
+Files are written to a temporary name and renamed into place, so readers
+never see a partial file. Unchanged feeds are not rewritten, which keeps
+their mtime (and nginx's ETag) stable. Publishing all apps removes the
+files and manifest entries of apps that no longer exist, since nginx
+would otherwise keep serving their last messages.
+"""
+
+import gzip
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .feed import build_feeds, feed_etag, feed_version, render_feed
+from .models import TargetApp
+
+MANIFEST_NAME = 'index.json'
+# App IDs are used as file names; anything else is not published.
+SAFE_APP_ID = re.compile(r'[A-Za-z0-9_-]+')
+
+
+def publishing_enabled():
+    return bool(getattr(settings, 'FEED_PUBLISH_ROOT', ''))
+
+
+def write_atomic(path, data):
+    """Write bytes to path via a temporary file and rename."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def publish_feeds(app_ids=None):
+    """
+    Publish the feeds of the given apps (all target apps by default, in
+    which case feeds of deleted apps are removed). Returns the number of
+    feed files that changed.
+    """
+    root = Path(settings.FEED_PUBLISH_ROOT)
+    root.mkdir(parents=True, exist_ok=True)
+    prune = app_ids is None
+    if prune:
+        app_ids = list(TargetApp.objects.values_list('app_id', flat=True))
+
+    manifest_path = root / MANIFEST_NAME
+    try:
+        manifest = json.loads(manifest_path.read_bytes())
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+
+    changed = 0
+    app_ids = [app_id for app_id in app_ids if SAFE_APP_ID.fullmatch(app_id)]
+    for app_id, messages in build_feeds(app_ids).items():
+        body = render_feed(messages)
+        version = feed_version(feed_etag(body))
+        path = root / f'{app_id}.json'
+        if manifest.get(app_id, {}).get('version') == version and path.exists():
+            continue
+        write_atomic(root / f'{app_id}.json.gz', gzip.compress(body, mtime=0))
+        write_atomic(path, body)
+        manifest[app_id] = {
+            'version': version,
+            'published_at': timezone.now().isoformat(),
+        }
+        changed += 1
+
+    if prune:
+        changed += remove_feeds(root, manifest, set(app_ids))
+
+    if changed:
+        write_atomic(manifest_path, json.dumps(manifest, indent=2).encode())
+    return changed
+
+
+def remove_feeds(root, manifest, keep):
+    """
+    Delete published feeds, and their manifest entries, of apps not in
+    keep. Returns the number of feeds removed.
+    """
+    stale = set(manifest) - keep
+    stale.update(
+        path.name.removesuffix('.json') for path in root.glob('*.json')
+        if path.name != MANIFEST_NAME
+    )
+    stale -= keep
+    for app_id in stale:
+        for path in (root / f'{app_id}.json', root / f'{app_id}.json.gz'):
+            path.unlink(missing_ok=True)
+        manifest.pop(app_id, None)
+    return len(stale)
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .feed import feeds_invalidated, invalidate_feeds
+from .models import PulseMessage, TargetApp
+from .publisher import publish_feeds, publishing_enabled
+
+
+@receiver(post_save, sender=PulseMessage)
+@receiver(post_delete, sender=PulseMessage)
+@receiver(post_save, sender=TargetApp)
+@receiver(post_delete, sender=TargetApp)
+def message_changed(sender, **kwargs):
+    invalidate_feeds()
+
+
+@receiver(m2m_changed, sender=PulseMessage.target_apps.through)
+def targeting_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_feeds()
+
+
+@receiver(feeds_invalidated)
+def publish_static_feeds(sender, **kwargs):
+    if publishing_enabled():
+        publish_feeds()
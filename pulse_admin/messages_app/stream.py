@@ -0,0 +1,115 @@
+"""
+Server-Sent Events for feed changes, served under ASGI.
+
+Each process keeps one FeedWatcher per app with open streams. The watcher
+polls the app's feed version in the cache (cheap: one small cache read
+per interval, whatever the number of subscribers) and wakes every
+subscriber when it changes. Admin edits replace the feed generation and
+schedule boundaries expire the cached feed, so both surface as a new
+version here. That only works when this process shares its cache backend
+with the web service (CACHE_BACKEND=...RedisCache in docker-compose.yml);
+a per-container file cache never sees the admin's generation changes.
+"""
+
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .feed import feed_version, get_feed, get_feed_meta
+
+logger = logging.getLogger(__name__)
+
+_watchers = {}
+
+
+def current_feed_version(app_id):
+    """Return the app's feed version, building the feed if it is not cached."""
+    meta = get_feed_meta(app_id)
+    if meta is None:
+        try:
+            meta = get_feed(app_id)
+        finally:
+            close_old_connections()
+    return feed_version(meta['etag'])
+
+
+class FeedWatcher:
+    """Polls one app's feed version and wakes its subscribers on change."""
+
+    def __init__(self, app_id):
+        self.app_id = app_id
+        self.version = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task = None
+
+    async def poll(self):
+        version = await sync_to_async(current_feed_version)(self.app_id)
+        if version != self.version:
+            self.version = version
+            # Swap the event so late waiters block on the next change.
+            changed, self.changed = self.changed, asyncio.Event()
+            changed.set()
+
+    async def run(self):
+        interval = getattr(settings, 'FEED_STREAM_POLL_INTERVAL', 2)
+        try:
+            while self.subscribers:
+                await asyncio.sleep(interval)
+                try:
+                    await self.poll()
+                except Exception:
+                    logger.exception("Feed watcher poll failed for %s", self.app_id)
+        finally:
+            if _watchers.get(self.app_id) is self:
+                del _watchers[self.app_id]
+
+
+def subscribe(app_id):
+    watcher = _watchers.get(app_id)
+    if watcher is None:
+        watcher = _watchers[app_id] = FeedWatcher(app_id)
+    watcher.subscribers += 1
+    if watcher.task is None:
+        watcher.task = asyncio.create_task(watcher.run())
+    return watcher
+
+
+def format_event(app_id, version):
+    data = json.dumps({'app_id': app_id, 'version': version})
+    return f"event: feed\ndata: {data}\n\n"
+
+
+async def feed_events(app_id):
+    """
+    Yield an SSE 'feed' event with the current version, then one per change,
+    with keep-alive comments in between. Ends after FEED_STREAM_TIMEOUT so
+    clients reconnect and connections get rebalanced.
+    """
+    heartbeat = getattr(settings, 'FEED_STREAM_HEARTBEAT', 15)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, 'FEED_STREAM_TIMEOUT', 300)
+
+    watcher = subscribe(app_id)
+    try:
+        if watcher.version is None:
+            await watcher.poll()
+        version = watcher.version
+        yield format_event(app_id, version)
+
+        while (remaining := deadline - loop.time()) > 0:
+            changed = watcher.changed
+            if watcher.version == version:
+                try:
+                    await asyncio.wait_for(changed.wait(), min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+            version = watcher.version
+            yield format_event(app_id, version)
+    finally:
+        watcher.subscribers -= 1
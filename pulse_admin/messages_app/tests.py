@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import PulseMessage, TargetApp
+
+TOKEN = 'test-token'
+
+
+@override_settings(
+    API_TOKEN=TOKEN,
+    API_APP_TOKENS={},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ActiveMessagesQueryCountTests(TestCase):
+    """The feed is built in a fixed number of queries and served from cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.apps = [
+            TargetApp.objects.create(app_id=f'app{index}', app_name=f'App {index}')
+            for index in range(3)
+        ]
+
+    def create_messages(self, count):
+        for index in range(count):
+            message = PulseMessage.objects.create(
+                title=f'Message {index}',
+                body='Body',
+                is_active=True,
+                start_date=timezone.now() - timedelta(hours=1),
+            )
+            message.target_apps.set(self.apps)
+
+    def get_feed(self):
+        return self.client.get('/api/messages/', {'app_id': 'app0', 'token': TOKEN})
+
+    def assert_feed_queries(self, message_count):
+        self.create_messages(message_count)
+        cache.clear()
+        with self.assertNumQueries(3):
+            response = self.get_feed()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), message_count)
+        with self.assertNumQueries(0):
+            response = self.get_feed()
+        self.assertEqual(response.status_code, 200)
+
+    def test_one_message(self):
+        self.assert_feed_queries(1)
+
+    def test_many_messages(self):
+        self.assert_feed_queries(20)
+
+
+@override_settings(FEED_FAST_PATH=False)
+class SerializedMessagesQueryCountTests(ActiveMessagesQueryCountTests):
+    """The same guarantees when feeds go through PulseMessageSerializer."""
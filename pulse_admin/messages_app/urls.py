@@ -3,6 +3,8 @@ from . import views
 
 urlpatterns = [
     path('messages/', views.ActiveMessagesView.as_view(), name='active-messages'),
+    path('messages/batch/', views.BatchMessagesView.as_view(), name='batch-messages'),
+    path('messages/stream/', views.FeedStreamView.as_view(), name='feed-stream'),
     path('messages/<int:message_id>/impression/', views.RecordImpressionView.as_view(), name='record-impression'),
     path('messages/<int:message_id>/tap/', views.RecordTapView.as_view(), name='record-tap'),
 ]
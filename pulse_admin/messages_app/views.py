@@ -1,46 +1,110 @@
+import uuid
+
 from rest_framework import generics, status, exceptions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.utils import timezone
-from django.db import models
+from rest_framework.renderers import JSONRenderer
 from django.conf import settings
-from .models import PulseMessage
-from .serializers import PulseMessageSerializer
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from .feed import (
+    feed_etag, feed_version, get_feed, get_feed_changes,
+    get_feed_meta, get_feeds, known_message_ids, render_feed, seconds_until,
+)
+from .stream import feed_events
+from .authentication import AUTHENTICATION_FAILED, is_authorized, requested_app_ids
 from analytics.models import MessageImpression, MessageTap
+from analytics.dedup import find_duplicates
+from analytics.ingest import record_events
 
 
 class TokenValidationMixin:
-    """Validates API token from query params."""
+    """
+    Validates API token from query params. Requests already checked by
+    APITokenMiddleware pass straight through.
+    """
 
     def validate_token(self, request):
+        if getattr(request, 'api_token_checked', False):
+            return
         token = request.query_params.get('token')
-        valid_token = getattr(settings, 'API_TOKEN', 'pulse_dev_token')
-        if token != valid_token:
-            raise exceptions.AuthenticationFailed(
-                "Authentication failed. Invalid token."
-            )
+        if not is_authorized(token, requested_app_ids(request.query_params)):
+            raise exceptions.AuthenticationFailed(AUTHENTICATION_FAILED)
+
+
+class FeedCacheHeadersMixin:
+    """Sets ETag and Cache-Control on feed responses."""
 
+    def set_feed_headers(self, response, etag, expires_at):
+        response['ETag'] = etag
 
-class ActiveMessagesView(TokenValidationMixin, generics.ListAPIView):
+        # Fresh until the next start/end boundary, capped so admin edits
+        # still reach clients promptly.
+        max_age = getattr(settings, 'FEED_HTTP_MAX_AGE', 60)
+        remaining = seconds_until(expires_at)
+        if remaining is not None:
+            max_age = min(max_age, remaining)
+        patch_cache_control(response, max_age=max_age)
+        return response
+
+
+class ActiveMessagesView(TokenValidationMixin, FeedCacheHeadersMixin, generics.ListAPIView):
     """
     GET /api/messages/?app_id=brighton&token=xxx
     Returns active messages for a specific app.
+    Served from the per-app feed cache (see feed.py); answers a matching
+    If-None-Match with 304 Not Modified. With FEED_FAST_PATH the cached,
+    pre-rendered JSON is returned as-is.
+
+    GET /api/messages/?app_id=brighton&since=<version>&token=xxx
+    Returns only the messages added or updated since that version and the
+    IDs removed, or a full snapshot if the version is too old.
     """
-    serializer_class = PulseMessageSerializer
 
-    def get_queryset(self):
-        app_id = self.request.query_params.get('app_id')
-        now = timezone.now()
+    def perform_content_negotiation(self, request, force=False):
+        if getattr(settings, 'FEED_FAST_PATH', True):
+            return (JSONRenderer(), JSONRenderer.media_type)
+        return super().perform_content_negotiation(request, force)
 
-        queryset = PulseMessage.objects.filter(
-            is_active=True,
-            start_date__lte=now,
-            target_apps__app_id=app_id
-        ).filter(
-            models.Q(end_date__isnull=True) | models.Q(end_date__gt=now)
-        ).order_by('priority', '-start_date').distinct()
+    def list(self, request, *args, **kwargs):
+        app_id = request.query_params.get('app_id')
+        since = request.query_params.get('since')
+        if since:
+            return self.list_changes(app_id, since)
 
-        return queryset
+        # Answer revalidations from the small meta entry before touching
+        # the feed itself.
+        meta = get_feed_meta(app_id)
+        response = None
+        if meta is not None:
+            response = get_conditional_response(request, etag=meta['etag'])
+        if response is None:
+            meta = get_feed(app_id)
+            response = get_conditional_response(request, etag=meta['etag'])
+        if response is None:
+            if getattr(settings, 'FEED_FAST_PATH', True):
+                response = HttpResponse(meta['body'], content_type=JSONRenderer.media_type)
+            else:
+                response = Response(meta['messages'])
+
+        return self.set_feed_headers(response, meta['etag'], meta['expires_at'])
+
+    def list_changes(self, app_id, since):
+        feed = get_feed(app_id)
+        changes = get_feed_changes(app_id, since, feed)
+        if changes is None:
+            data = {'version': feed_version(feed['etag']), 'full': True, 'messages': feed['messages']}
+        else:
+            data = {
+                'version': feed_version(feed['etag']),
+                'full': False,
+                'messages': changes['changed'],
+                'removed': changes['removed'],
+            }
+        return Response(data)
 
     def get(self, request, *args, **kwargs):
         self.validate_token(request)
@@ -55,42 +119,95 @@ class ActiveMessagesView(TokenValidationMixin, generics.ListAPIView):
         return super().get(request, *args, **kwargs)
 
 
-class RecordImpressionView(TokenValidationMixin, APIView):
+class BatchMessagesView(TokenValidationMixin, FeedCacheHeadersMixin, APIView):
     """
-    POST /api/messages/{id}/impression/?app_id=brighton&token=xxx
-    Records that a message was displayed.
+    GET /api/messages/batch/?app_ids=brighton,edinburgh&token=xxx
+    Returns active messages for several apps as {app_id: [messages]}.
+    Feeds missing from the cache are built together in one query.
     """
+    max_apps = 50
 
-    def post(self, request, message_id):
+    def perform_content_negotiation(self, request, force=False):
+        if getattr(settings, 'FEED_FAST_PATH', True):
+            return (JSONRenderer(), JSONRenderer.media_type)
+        return super().perform_content_negotiation(request, force)
+
+    def get(self, request):
         self.validate_token(request)
 
-        app_id = request.query_params.get('app_id')
-        if not app_id:
+        app_ids = list(dict.fromkeys(
+            app_id for app_id in request.query_params.get('app_ids', '').split(',') if app_id
+        ))
+        if not app_ids:
             return Response(
-                {"error": "app_id is required"},
+                {"error": "app_ids query parameter is required"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        try:
-            message = PulseMessage.objects.get(id=message_id)
-            MessageImpression.objects.create(
-                message=message,
-                app_id=app_id
-            )
-            return Response({"status": "recorded"}, status=status.HTTP_201_CREATED)
-        except PulseMessage.DoesNotExist:
+        if len(app_ids) > self.max_apps:
             return Response(
-                {"error": "Message not found"},
-                status=status.HTTP_404_NOT_FOUND
+                {"error": f"At most {self.max_apps} app_ids per request"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
+        feeds = get_feeds(app_ids)
+        etag = feed_etag(''.join(feeds[app_id]['etag'] for app_id in app_ids).encode())
+        transitions = [feeds[app_id]['expires_at'] for app_id in app_ids]
+        expires_at = min((t for t in transitions if t is not None), default=None)
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            if getattr(settings, 'FEED_FAST_PATH', True):
+                # Splice the cached per-app bodies into one JSON object.
+                body = b'{' + b','.join(
+                    render_feed(app_id) + b':' + feeds[app_id]['body'] for app_id in app_ids
+                ) + b'}'
+                response = HttpResponse(body, content_type=JSONRenderer.media_type)
+            else:
+                response = Response({app_id: feeds[app_id]['messages'] for app_id in app_ids})
+        return self.set_feed_headers(response, etag, expires_at)
 
-class RecordTapView(TokenValidationMixin, APIView):
+
+class FeedStreamView(View):
     """
-    POST /api/messages/{id}/tap/?app_id=brighton&token=xxx
-    Records that a message CTA was tapped.
+    GET /api/messages/stream/?app_id=brighton&token=xxx
+    Server-Sent Events stream announcing each new feed version for an app.
+    Async: run under ASGI (see the stream service in docker-compose.yml).
     """
 
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            # Under WSGI the whole stream would be buffered in a sync worker
+            # for FEED_STREAM_TIMEOUT before anything reached the client.
+            return JsonResponse(
+                {"error": "The feed stream is only served by the ASGI stream service"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        if not getattr(request, 'api_token_checked', False):
+            token = request.GET.get('token')
+            if not is_authorized(token, requested_app_ids(request.GET)):
+                return JsonResponse(
+                    {"detail": AUTHENTICATION_FAILED},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+
+        app_id = request.GET.get('app_id')
+        if not app_id:
+            return JsonResponse(
+                {"error": "app_id query parameter is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        response = StreamingHttpResponse(feed_events(app_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class RecordEventView(TokenValidationMixin, APIView):
+    """Records an analytics event for a message (see analytics.ingest)."""
+    event_model = None
+
     def post(self, request, message_id):
         self.validate_token(request)
 
@@ -101,15 +218,49 @@ class RecordTapView(TokenValidationMixin, APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            message = PulseMessage.objects.get(id=message_id)
-            MessageTap.objects.create(
-                message=message,
-                app_id=app_id
-            )
-            return Response({"status": "recorded"}, status=status.HTTP_201_CREATED)
-        except PulseMessage.DoesNotExist:
+        event_id = request.query_params.get('event_id')
+        if event_id:
+            try:
+                event_id = uuid.UUID(event_id)
+            except ValueError:
+                return Response(
+                    {"error": "event_id must be a UUID"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        message_ids = known_message_ids()
+        if message_ids is not None and message_id not in message_ids:
             return Response(
                 {"error": "Message not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
+
+        event = self.event_model(
+            message_id=message_id, app_id=app_id,
+            timestamp=timezone.now(), event_id=event_id or None,
+        )
+        if find_duplicates([event]):
+            return Response({"status": "duplicate"}, status=status.HTTP_200_OK)
+
+        if not record_events([event]):
+            return Response(
+                {"error": "Event could not be recorded"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        return Response({"status": "recorded"}, status=status.HTTP_201_CREATED)
+
+
+class RecordImpressionView(RecordEventView):
+    """
+    POST /api/messages/{id}/impression/?app_id=brighton&token=xxx
+    Records that a message was displayed.
+    """
+    event_model = MessageImpression
+
+
+class RecordTapView(RecordEventView):
+    """
+    POST /api/messages/{id}/tap/?app_id=brighton&token=xxx
+    Records that a message CTA was tapped.
+    """
+    event_model = MessageTap
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'messages_app.authentication.APITokenMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,6 +88,18 @@ else:
         }
     }
 
+# Cache
+# Must be shared by every process that reads feeds or the feed generation:
+# gunicorn workers, the ASGI stream service, the publisher and the replayer.
+# The file cache default only covers one container; docker-compose.yml uses
+# Redis so an admin save in web is seen by the other services at once.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/pulse_cache'),
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -118,6 +131,60 @@ CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', 'http://localhost:8000'
 # API Token
 API_TOKEN = os.getenv('API_TOKEN', 'pulse_dev_token')
 
+# Per-app API tokens, e.g. "brighton:token1,edinburgh:token2". A scoped token
+# only works for requests naming its own app(s).
+API_APP_TOKENS = dict(
+    pair.split(':', 1) for pair in os.getenv('API_APP_TOKENS', '').split(',') if ':' in pair
+)
+
+# Message feeds (seconds). Cached feeds expire at the next message start/end
+# and are dropped whenever messages change; these are upper bounds.
+FEED_CACHE_TIMEOUT = int(os.getenv('FEED_CACHE_TIMEOUT', '3600'))
+FEED_HTTP_MAX_AGE = int(os.getenv('FEED_HTTP_MAX_AGE', '60'))
+# Serve feeds as pre-rendered JSON built from .values(), skipping DRF
+# serializers and rendering.
+FEED_FAST_PATH = os.getenv('FEED_FAST_PATH', 'True').lower() == 'true'
+# Feed versions per app kept for ?since= delta requests, and seconds a change
+# log is kept after its last new version.
+FEED_CHANGE_LOG_SIZE = int(os.getenv('FEED_CHANGE_LOG_SIZE', '20'))
+FEED_CHANGE_LOG_TIMEOUT = int(os.getenv('FEED_CHANGE_LOG_TIMEOUT', '86400'))
+# Server-Sent Events feed stream (seconds).
+FEED_STREAM_POLL_INTERVAL = float(os.getenv('FEED_STREAM_POLL_INTERVAL', '2'))
+FEED_STREAM_HEARTBEAT = int(os.getenv('FEED_STREAM_HEARTBEAT', '15'))
+FEED_STREAM_TIMEOUT = int(os.getenv('FEED_STREAM_TIMEOUT', '300'))
+# Static feed files for nginx (publishing is off when unset). The publisher
+# also re-checks every FEED_PUBLISH_INTERVAL seconds between boundaries.
+FEED_PUBLISH_ROOT = os.getenv('FEED_PUBLISH_ROOT', '')
+FEED_PUBLISH_INTERVAL = int(os.getenv('FEED_PUBLISH_INTERVAL', '300'))
+
+# Analytics ingestion: 'direct' (one INSERT per event), 'buffer' (acknowledge
+# once buffered, bulk insert in the background), 'flush' (acknowledge after
+# the bulk insert) or 'spool' (append to a local file that replay_spool
+# drains). See analytics/ingest.py.
+ANALYTICS_INGEST_MODE = os.getenv('ANALYTICS_INGEST_MODE', 'direct')
+ANALYTICS_BUFFER_SIZE = int(os.getenv('ANALYTICS_BUFFER_SIZE', '500'))
+ANALYTICS_BUFFER_INTERVAL = float(os.getenv('ANALYTICS_BUFFER_INTERVAL', '1.0'))
+ANALYTICS_FLUSH_TIMEOUT = float(os.getenv('ANALYTICS_FLUSH_TIMEOUT', '10'))
+# Max events per POST /api/events/ request.
+ANALYTICS_MAX_BATCH = int(os.getenv('ANALYTICS_MAX_BATCH', '500'))
+# 'spool' mode: segment directory (shared with the replayer), fsync batching
+# interval and segment rotation limits.
+ANALYTICS_SPOOL_DIR = os.getenv('ANALYTICS_SPOOL_DIR', str(BASE_DIR / 'spool'))
+ANALYTICS_SPOOL_FSYNC_INTERVAL = float(os.getenv('ANALYTICS_SPOOL_FSYNC_INTERVAL', '0.2'))
+ANALYTICS_SPOOL_SEGMENT_BYTES = int(os.getenv('ANALYTICS_SPOOL_SEGMENT_BYTES', str(16 * 1024 * 1024)))
+ANALYTICS_SPOOL_SEGMENT_SECONDS = int(os.getenv('ANALYTICS_SPOOL_SEGMENT_SECONDS', '60'))
+# Seconds a client event_id is remembered to drop retried duplicates.
+ANALYTICS_DEDUP_WINDOW = int(os.getenv('ANALYTICS_DEDUP_WINDOW', '86400'))
+# On PostgreSQL raw events are partitioned by month (see analytics/partitions.py);
+# maintain_partitions keeps this many months created ahead and drops months
+# older than ANALYTICS_RETENTION_MONTHS (0 keeps everything).
+ANALYTICS_PARTITION_MONTHS_AHEAD = int(os.getenv('ANALYTICS_PARTITION_MONTHS_AHEAD', '3'))
+ANALYTICS_RETENTION_MONTHS = int(os.getenv('ANALYTICS_RETENTION_MONTHS', '0'))
+# Seconds GET /api/analytics/ pages are cached (server side and max-age).
+ANALYTICS_API_CACHE_TIMEOUT = int(os.getenv('ANALYTICS_API_CACHE_TIMEOUT', '60'))
+# Seconds the admin analytics dashboard is cached for.
+ANALYTICS_DASHBOARD_CACHE_TIMEOUT = int(os.getenv('ANALYTICS_DASHBOARD_CACHE_TIMEOUT', '60'))
+
 # Django Unfold admin configuration
 UNFOLD = {
     "SITE_TITLE": "Pulse Admin",
@@ -125,6 +192,7 @@ UNFOLD = {
     "SITE_SUBHEADER": "Centralized In-App Messaging",
     "SHOW_HISTORY": True,
     "SHOW_VIEW_ON_SITE": True,
+    "DASHBOARD_CALLBACK": "analytics.dashboard.dashboard_callback",
     "STYLES": [
         lambda request: static("admin/css/message_admin_unfold.css"),
     ],
@@ -9,6 +9,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('messages_app.urls')),
     path('api/', include('api_keys.urls')),
+    path('api/', include('analytics.urls')),
 ]
 
 if settings.DEBUG: